@@ -0,0 +1,161 @@
+import os
+import sys
+import time
+import sqlite3
+import threading
+from pathlib import Path
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,      -- relative to the dataset directory
+    source TEXT NOT NULL,           -- source photo the variant was made from
+    variant TEXT NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    updated_at REAL
+);
+CREATE TABLE IF NOT EXISTS boxes (
+    image_id INTEGER NOT NULL REFERENCES images(id) ON DELETE CASCADE,
+    class_id INTEGER NOT NULL,
+    x_center REAL NOT NULL,
+    y_center REAL NOT NULL,
+    width REAL NOT NULL,
+    height REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_boxes_image ON boxes(image_id);
+CREATE INDEX IF NOT EXISTS idx_boxes_class ON boxes(class_id);
+CREATE INDEX IF NOT EXISTS idx_images_source ON images(source);
+"""
+
+class AnnotationIndex:
+    """
+    One SQLite file mirroring every YOLO label in a dataset.
+
+    The txt files stay the training input; the index answers class balance,
+    per-source and split questions with a query instead of re-parsing
+    hundreds of label files.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = str(db_path)
+        self.lock = threading.Lock()
+        # The labeller writes from a background thread; all access goes through the lock
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.executescript(SCHEMA)
+
+    def replace_images(self, entries):
+        """
+        Store labels for several images in one transaction.
+        entries: iterable of (path, source, variant, width, height, labels) with
+        labels as rows of (class_id, x_center, y_center, width, height).
+        """
+        now = time.time()
+        with self.lock, self.conn:
+            for path, source, variant, width, height, labels in entries:
+                self.conn.execute("DELETE FROM images WHERE path = ?", (path,))
+                image_id = self.conn.execute(
+                    "INSERT INTO images (path, source, variant, width, height, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (path, source, variant, width, height, now)
+                ).lastrowid
+                self.conn.executemany(
+                    "INSERT INTO boxes (image_id, class_id, x_center, y_center, width, height) VALUES (?, ?, ?, ?, ?, ?)",
+                    [(image_id, int(row[0]), *map(float, row[1:5])) for row in labels]
+                )
+
+    def prune_images(self, prefix, keep_paths):
+        """Delete images under prefix (e.g. 'train/images/') that are not in keep_paths; returns how many"""
+        keep_paths = set(keep_paths)
+        with self.lock, self.conn:
+            # substr instead of LIKE so '_' and '%' in file names match literally
+            stale = [
+                (path,) for path, in self.conn.execute(
+                    "SELECT path FROM images WHERE substr(path, 1, ?) = ?", (len(prefix), prefix)
+                )
+                if path not in keep_paths
+            ]
+            # Boxes go with their image through ON DELETE CASCADE
+            self.conn.executemany("DELETE FROM images WHERE path = ?", stale)
+        return len(stale)
+
+    def class_counts(self):
+        """Class id -> (box count, image count)"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT class_id, COUNT(*), COUNT(DISTINCT image_id) FROM boxes GROUP BY class_id ORDER BY class_id"
+            ).fetchall()
+        return {class_id: (boxes, images) for class_id, boxes, images in rows}
+
+    def source_classes(self):
+        """Source photo -> sorted class ids it contains (used for stratified splits)"""
+        with self.lock:
+            # Left join keeps background photos that have no boxes
+            rows = self.conn.execute(
+                "SELECT DISTINCT i.source, b.class_id FROM images i LEFT JOIN boxes b ON b.image_id = i.id"
+            ).fetchall()
+        sources = {}
+        for source, class_id in rows:
+            classes = sources.setdefault(source, [])
+            if class_id is not None:
+                classes.append(class_id)
+        return {source: sorted(classes) for source, classes in sources.items()}
+
+    def images_for_sources(self, sources):
+        """Image paths for the given source photos"""
+        sources = list(sources)
+        paths = []
+        with self.lock:
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(sources), 500):
+                chunk = sources[start:start + 500]
+                paths.extend(row[0] for row in self.conn.execute(
+                    f"SELECT path FROM images WHERE source IN ({','.join('?' * len(chunk))}) ORDER BY path",
+                    chunk
+                ))
+        return paths
+
+    def stats(self):
+        with self.lock:
+            images, sources = self.conn.execute("SELECT COUNT(*), COUNT(DISTINCT source) FROM images").fetchone()
+            boxes, = self.conn.execute("SELECT COUNT(*) FROM boxes").fetchone()
+        return {'images': images, 'sources': sources, 'boxes': boxes, 'classes': self.class_counts()}
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+def rebuild_index(dataset_dir, split='train'):
+    """Index the existing YOLO label files of a dataset directory, dropping images no longer in the split"""
+    from data_augmentation import read_yolo_labels, split_variant_name
+
+    dataset_dir = Path(dataset_dir)
+    images_dir = dataset_dir / split / 'images'
+    labels_dir = dataset_dir / split / 'labels'
+
+    entries = []
+    for image_name in sorted(os.listdir(images_dir)):
+        if not image_name.lower().endswith(('.png', '.jpg', '.jpeg')):
+            continue
+        source, variant = split_variant_name(image_name)
+        labels = read_yolo_labels(str(labels_dir / (os.path.splitext(image_name)[0] + '.txt')))
+        entries.append((f"{split}/images/{image_name}", source, variant, None, None, labels))
+
+    index = AnnotationIndex(dataset_dir / 'annotations.sqlite')
+    index.replace_images(entries)
+    removed = index.prune_images(f"{split}/images/", [entry[0] for entry in entries])
+    if removed:
+        print(f"Removed {removed} images no longer in {split} from the index")
+    return index
+
+if __name__ == "__main__":
+    dataset_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join("model_files", "yolo_dataset_20241105_134756")
+    start = time.perf_counter()
+    index = rebuild_index(dataset_dir)
+    print(f"Indexed in {time.perf_counter() - start:.2f}s")
+    start = time.perf_counter()
+    stats = index.stats()
+    print(f"{stats['images']} images from {stats['sources']} sources, {stats['boxes']} boxes "
+          f"(queried in {1000 * (time.perf_counter() - start):.1f} ms)")
+    for class_id, (boxes, images) in stats['classes'].items():
+        print(f"  class {class_id}: {boxes} boxes in {images} images")
@@ -0,0 +1,34 @@
+import os
+
+from PIL import Image
+
+CACHE_DIR = ".cache"  # Inside the assets folder
+
+def load_asset(path, size):
+    """
+    PIL image of an asset at the given size. The resized copy is kept as a
+    PNG next to the assets and reused until the original file changes, so
+    launches after the first skip the LANCZOS resize.
+    """
+    directory, filename = os.path.split(path)
+    stem = os.path.splitext(filename)[0]
+    cache_path = os.path.join(directory, CACHE_DIR, f"{stem}_{size[0]}x{size[1]}.png")
+
+    try:
+        if os.path.getmtime(cache_path) >= os.path.getmtime(path):
+            image = Image.open(cache_path)
+            image.load()
+            return image
+    except OSError:
+        pass
+
+    image = Image.open(path).resize(size, Image.Resampling.LANCZOS)
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        temp_path = f"{cache_path}.tmp"
+        image.save(temp_path, format='PNG', compress_level=1)
+        os.replace(temp_path, cache_path)
+    except OSError as e:
+        # Read-only install: still works, just resizes every launch
+        print(f"Could not cache {filename}: {e}")
+    return image
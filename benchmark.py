@@ -0,0 +1,321 @@
+"""
+Headless benchmark of the detection hot path.
+
+Replays images (or a recorded .npy frame file) through the same steps the
+checkout window runs per frame: capture -> preprocess -> inference ->
+postprocess -> overlay -> resize. Reports per-stage latency percentiles,
+throughput and peak RSS, optionally as JSON for comparing commits and
+backends. A fake Picamera2 serves the frames so no camera is needed.
+--allocations also reports the memory allocated per frame by the legacy
+display path (copy + PIL resize) and the reused-buffer DisplayRenderer.
+
+    python benchmark.py --backend onnx --frames 200 --json bench_onnx.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+import yaml
+
+from inference_backends import BACKENDS, load_backend, predictions_to_detections
+from frame_overlay import DISPLAY_SIZE, DisplayRenderer, draw_detections, resize_for_display
+
+FRAME_SIZE = (640, 480)  # Same as the Picamera2 main stream
+
+def load_frames(source, limit=None, size=FRAME_SIZE):
+    """Frames from a .npy recording or every image under a directory, resized to camera size"""
+    if source.endswith('.npy'):
+        frames = np.load(source, mmap_mode='r')
+        return [np.array(frame) for frame in frames[:limit]]
+
+    image_paths = []
+    for dirpath, _, filenames in sorted(os.walk(source)):
+        image_paths.extend(
+            os.path.join(dirpath, f) for f in sorted(filenames)
+            if f.lower().endswith(('.png', '.jpg', '.jpeg'))
+        )
+    if limit:
+        image_paths = image_paths[:limit]
+
+    frames = []
+    for image_path in image_paths:
+        image = cv2.imread(image_path)
+        if image is None:
+            print(f"Could not read image: {image_path}")
+            continue
+        frames.append(cv2.resize(image, size))
+    return frames
+
+def record_frames(picam2, output_path, count=100):
+    """Save frames from a real camera so they can be replayed off the Pi"""
+    frames = np.stack([picam2.capture_array() for _ in range(count)])
+    np.save(output_path, frames)
+    print(f"Recorded {count} frames to {output_path}")
+
+class FakePicamera2:
+    """Stand-in for picamera2.Picamera2 that serves pre-loaded frames in a loop"""
+
+    def __init__(self, frames, fps=None):
+        if not len(frames):
+            raise ValueError("FakePicamera2 needs at least one frame")
+        self.frames = frames
+        self.frame_interval = 1.0 / fps if fps else 0.0
+        self.config = None
+        self.controls = {}
+        self.started = False
+        self._index = 0
+        self._next_frame_time = 0.0
+
+    def create_preview_configuration(self, main=None, lores=None, **kwargs):
+        # A lores stream is served as YUV420, like the Pi's ISP delivers it
+        return {'main': main, 'lores': lores, **kwargs}
+
+    def configure(self, config):
+        self.config = config
+
+    def set_controls(self, controls):
+        self.controls.update(controls)
+
+    def start(self):
+        self.started = True
+
+    def stop(self):
+        self.started = False
+
+    def capture_arrays(self, names):
+        frame = self.capture_array()
+        return [frame if name == 'main' else self.lores_from(frame) for name in names], {}
+
+    def lores_from(self, frame):
+        # Done in software here; on the Pi the ISP scales the lores stream, so capture timings include it.
+        # Replayed frames are BGR, like the Pi's RGB888 main stream
+        width, height = self.config['lores']['size']
+        return cv2.cvtColor(cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2YUV_I420)
+
+    def capture_array(self, name='main'):
+        # Pace delivery like a real sensor when a frame rate is given
+        if self.frame_interval:
+            delay = self._next_frame_time - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            self._next_frame_time = time.perf_counter() + self.frame_interval
+
+        frame = self.frames[self._index % len(self.frames)]
+        self._index += 1
+        if name == 'lores':
+            return self.lores_from(frame)
+        # The real camera hands out a fresh buffer on every call
+        return frame.copy()
+
+class StageTimer:
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        yield
+        self.samples[name].append(time.perf_counter() - start)
+
+    def summary(self):
+        summary = {}
+        for name, samples in self.samples.items():
+            ms = np.array(samples) * 1000
+            summary[name] = {
+                'count': len(ms),
+                'mean_ms': float(ms.mean()),
+                'p50_ms': float(np.percentile(ms, 50)),
+                'p95_ms': float(np.percentile(ms, 95)),
+                'p99_ms': float(np.percentile(ms, 99))
+            }
+        return summary
+
+def peak_rss_mb():
+    """Peak resident memory in MB, or None where the resource module is missing (Windows)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+def process_frame(camera, backend, class_names, timer, renderer=None):
+    """One pass of the per-frame path, timing each stage"""
+    with timer.stage('capture'):
+        if renderer is not None:
+            (frame, preview), _ = camera.capture_arrays(['main', 'lores'])
+        else:
+            frame = camera.capture_array()
+
+    detections = []
+    if backend is not None and hasattr(backend, 'session'):
+        # ONNX backends expose their stages separately
+        with timer.stage('preprocess'):
+            blob, ratio, pad = backend.preprocess(frame)
+        with timer.stage('inference'):
+            output = backend.session.run(None, {backend.input_name: blob})[0]
+        with timer.stage('postprocess'):
+            predictions = backend.postprocess(output[0], ratio, pad, frame.shape)
+            detections = predictions_to_detections(predictions, class_names)
+    elif backend is not None:
+        with timer.stage('inference'):
+            predictions = backend.predict(frame)
+        with timer.stage('postprocess'):
+            detections = predictions_to_detections(predictions, class_names)
+
+    if renderer is not None:
+        with timer.stage('display'):
+            renderer.render([frame], [detections], [preview])
+    else:
+        with timer.stage('overlay'):
+            frame = draw_detections(frame, detections)
+        with timer.stage('resize'):
+            resize_for_display(frame)
+    return detections
+
+def legacy_display(frame, detections):
+    """Display path before DisplayRenderer: copy, overlay, PIL resize"""
+    return resize_for_display(draw_detections(frame, detections))
+
+def measure_display_allocations(camera, num_frames=50, use_lores=True):
+    """
+    Peak bytes allocated while rendering one frame, for the legacy path and
+    the DisplayRenderer (fed the lores stream when use_lores). Capture is
+    outside the measurement. tracemalloc sees numpy buffers but not PIL's
+    or Tk's own pixel memory, so the legacy figure is a lower bound.
+    """
+    detections = [{'class': 'item', 'confidence': 0.9, 'bbox': [100, 100, 300, 260], 'track_id': 1}]
+    renderer = DisplayRenderer(1)
+    paths = {
+        'legacy': lambda frame, preview: legacy_display(frame, detections),
+        'renderer': lambda frame, preview: renderer.render([frame], [detections], [preview])
+    }
+
+    results = {}
+    tracemalloc.start()
+    try:
+        for name, render in paths.items():
+            peaks = []
+            for i in range(num_frames + 1):
+                if use_lores:
+                    (frame, preview), _ = camera.capture_arrays(['main', 'lores'])
+                else:
+                    frame, preview = camera.capture_array(), None
+                tracemalloc.reset_peak()
+                baseline = tracemalloc.get_traced_memory()[0]
+                render(frame, preview)
+                if i:  # First frame warms up
+                    peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+            results[name] = {
+                'mean_kb_per_frame': float(np.mean(peaks)) / 1024,
+                'max_kb_per_frame': float(np.max(peaks)) / 1024
+            }
+    finally:
+        tracemalloc.stop()
+    return results
+
+def run_benchmark(camera, backend, class_names, num_frames=100, warmup=5, renderer=None):
+    for _ in range(warmup):
+        process_frame(camera, backend, class_names, StageTimer(), renderer)
+
+    timer = StageTimer()
+    start = time.perf_counter()
+    for _ in range(num_frames):
+        with timer.stage('total'):
+            process_frame(camera, backend, class_names, timer, renderer)
+    elapsed = time.perf_counter() - start
+
+    return {
+        'frames': num_frames,
+        'throughput_fps': num_frames / elapsed if elapsed else 0.0,
+        'stages': timer.summary(),
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+def print_report(results):
+    print(f"Backend: {results['backend']}  commit: {results['commit']}  frames: {results['frames']}")
+    print(f"{'stage':<12} {'mean':>8} {'p50':>8} {'p95':>8} {'p99':>8}  (ms)")
+    for name, stats in results['stages'].items():
+        print(f"{name:<12} {stats['mean_ms']:8.2f} {stats['p50_ms']:8.2f} "
+              f"{stats['p95_ms']:8.2f} {stats['p99_ms']:8.2f}")
+    peak = results['peak_rss_mb']
+    print(f"Throughput: {results['throughput_fps']:.1f} FPS  Peak RSS: "
+          + (f"{peak:.0f} MB" if peak is not None else "n/a"))
+    for name, stats in results.get('display_allocations', {}).items():
+        print(f"Display {name:<9} allocates {stats['mean_kb_per_frame']:8.1f} KB/frame "
+              f"(max {stats['max_kb_per_frame']:.1f})")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the checkout detection path without a camera")
+    parser.add_argument('--source', default='augmented_datasets', help="image directory or recorded .npy frames")
+    parser.add_argument('--backend', default='auto', choices=['auto', 'none', *BACKENDS])
+    parser.add_argument('--weights', default='runs/train/exp/weights/best.pt')
+    parser.add_argument('--data', default='dataset_config.yaml', help="YAML with class names")
+    parser.add_argument('--frames', type=int, default=100)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--max-images', type=int, default=200, help="frames to load from --source")
+    parser.add_argument('--camera-fps', type=float, default=None, help="pace the fake camera")
+    parser.add_argument('--display', default='renderer', choices=['renderer', 'legacy'],
+                        help="reused-buffer display from the lores stream, or copy + PIL resize")
+    parser.add_argument('--allocations', action='store_true', help="measure display allocations per frame")
+    parser.add_argument('--json', help="write results to this file")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+
+    frames = load_frames(args.source, args.max_images)
+    camera = FakePicamera2(frames, fps=args.camera_fps)
+    camera.configure(camera.create_preview_configuration(
+        main={"size": FRAME_SIZE, "format": "RGB888"},
+        lores={"size": DISPLAY_SIZE, "format": "YUV420"}
+    ))
+    camera.start()
+
+    with open(args.data, 'r') as f:
+        class_names = yaml.safe_load(f)['names']
+
+    backend = None
+    if args.backend != 'none':
+        backend = load_backend(args.backend, args.weights, conf_threshold=0.25)
+
+    renderer = DisplayRenderer(1) if args.display == 'renderer' else None
+    results = run_benchmark(camera, backend, class_names, args.frames, args.warmup, renderer)
+    if args.allocations:
+        results['display_allocations'] = measure_display_allocations(camera)
+    results.update({
+        'backend': backend.name if backend else 'none',
+        'display': args.display,
+        'source': args.source,
+        'commit': git_commit(),
+        'platform': platform.platform(),
+        'machine': platform.machine()
+    })
+    print_report(results)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.json}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+FRAME_SIZE = (640, 480)  # Every source is delivered at this size so frames can be batched
+
+class PicameraSource:
+    """
+    Raspberry Pi camera through Picamera2. With preview_size, a second lores
+    stream is scaled by the ISP to exactly the display size and kept in
+    latest_preview, so the UI never resizes full frames.
+    """
+
+    def __init__(self, index=0, size=FRAME_SIZE, preview_size=None):
+        from picamera2 import Picamera2
+        from libcamera import Transform
+
+        self.name = f"picam:{index}"
+        self.picam2 = Picamera2(index)
+        self.preview_size = preview_size
+        self.latest_preview = None
+        preview_config = self.picam2.create_preview_configuration(
+            main={"size": size, "format": "RGB888"},
+            # The lores stream is YUV420 only on most Pi models
+            lores={"size": preview_size, "format": "YUV420"} if preview_size else None,
+            transform=Transform(vflip=False, hflip=False)
+        )
+        self.picam2.configure(preview_config)
+        self.picam2.set_controls({"AwbEnable": True})
+        self.picam2.set_controls({"ColourGains": (1.0, 1.0)})
+        self.picam2.start()
+
+    def read(self):
+        if not self.preview_size:
+            return self.picam2.capture_array()
+        # Both streams come from the same request, so preview and frame match
+        (frame, self.latest_preview), _ = self.picam2.capture_arrays(["main", "lores"])
+        return frame
+
+    def close(self):
+        self.picam2.stop()
+
+class VideoCaptureSource:
+    """USB webcam or video file through cv2.VideoCapture; files loop at the end"""
+
+    def __init__(self, device=0, size=FRAME_SIZE):
+        self.name = f"usb:{device}" if isinstance(device, int) else f"file:{device}"
+        self.size = size
+        self.is_file = not isinstance(device, int)
+        self.cap = cv2.VideoCapture(device)
+        if not self.cap.isOpened():
+            raise IOError(f"Could not open video source: {device}")
+        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, size[0])
+        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, size[1])
+
+    def read(self):
+        ret, frame = self.cap.read()
+        if not ret and self.is_file:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.cap.read()
+        if not ret:
+            raise IOError(f"Could not read frame from {self.name}")
+        # Webcams may ignore the requested size
+        if (frame.shape[1], frame.shape[0]) != self.size:
+            frame = cv2.resize(frame, self.size)
+        return frame
+
+    def close(self):
+        self.cap.release()
+
+class ReplaySource:
+    """Image folder or recorded .npy frames, replayed in a loop (see benchmark.py)"""
+
+    def __init__(self, path, size=FRAME_SIZE, fps=30):
+        from benchmark import FakePicamera2, load_frames
+
+        self.name = f"file:{path}"
+        self.camera = FakePicamera2(load_frames(path, size=size), fps=fps)
+
+    def read(self):
+        return self.camera.capture_array()
+
+    def close(self):
+        pass
+
+def open_source(spec, size=FRAME_SIZE, preview_size=None):
+    """
+    Open one camera from a spec string:
+    'picam:0', 'usb:1', or 'file:<video, image folder or .npy>'.
+    preview_size asks cameras that can scale in hardware for a display-sized stream.
+    """
+    kind, _, target = spec.partition(':')
+    if kind == 'picam':
+        return PicameraSource(int(target or 0), size, preview_size)
+    if kind == 'usb':
+        return VideoCaptureSource(int(target or 0), size)
+    if kind == 'file':
+        if os.path.isdir(target) or target.endswith('.npy'):
+            return ReplaySource(target, size)
+        return VideoCaptureSource(target, size)
+    raise ValueError(f"Unknown camera spec: {spec} (use picam:N, usb:N or file:PATH)")
+
+def open_sources(specs, size=FRAME_SIZE, preview_size=None):
+    """
+    Open a comma-separated list of camera specs, e.g. 'picam:0,usb:0'.
+    preview_size may be a function of the camera count, as the display is shared.
+    """
+    specs = [spec.strip() for spec in specs.split(',') if spec.strip()]
+    if callable(preview_size):
+        preview_size = preview_size(len(specs))
+    return [open_source(spec, size, preview_size) for spec in specs]
+
+class MultiCameraCapture:
+    """
+    Reads every camera on its own thread and hands out one frame per camera
+    as a single (cameras, H, W, 3) batch.
+
+    capture() waits until each camera has a frame newer than the last batch,
+    so views in a batch were taken at nearly the same time; `skew` is the
+    spread of their capture times in seconds. `previews` holds the lores
+    preview of each camera (None where a camera has none) taken with the
+    frames of the last batch.
+
+    A camera with no new frame within `timeout` is marked in `stale` and its
+    last frame (black if it never delivered one) is reused, so one dead
+    camera does not hold back the others. Batches stop waiting for stale
+    cameras until they deliver again.
+    """
+
+    def __init__(self, sources, timeout=1.0):
+        if not sources:
+            raise ValueError("MultiCameraCapture needs at least one source")
+        self.sources = sources
+        self.timeout = timeout
+
+        self._latest = [None] * len(sources)  # (frame, timestamp, sequence, preview) per camera
+        self._delivered = [0] * len(sources)
+        self._cond = threading.Condition()
+        self._stop_event = threading.Event()
+        self._threads = []
+        self.skew = 0.0
+        self.previews = [None] * len(sources)
+        self.stale = [False] * len(sources)
+
+    @property
+    def names(self):
+        return [source.name for source in self.sources]
+
+    def start(self):
+        self._stop_event.clear()
+        self._threads = [
+            threading.Thread(target=self._read_loop, args=(i,), name=f"camera-{i}", daemon=True)
+            for i in range(len(self.sources))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout=2.0):
+        self._stop_event.set()
+        with self._cond:
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        for source in self.sources:
+            try:
+                source.close()
+            except Exception as e:
+                print(f"Error closing {source.name}: {e}")
+
+    def _read_loop(self, index):
+        source = self.sources[index]
+        sequence = 0
+        while not self._stop_event.is_set():
+            try:
+                frame = source.read()
+                preview = getattr(source, 'latest_preview', None)
+            except Exception as e:
+                print(f"Error capturing from {source.name}: {e}")
+                self._stop_event.wait(1.0)
+                continue
+
+            sequence += 1
+            with self._cond:
+                self._latest[index] = (frame, time.perf_counter(), sequence, preview)
+                self._cond.notify_all()
+
+    def _fresh(self):
+        return [
+            latest is not None and latest[2] > delivered
+            for latest, delivered in zip(self._latest, self._delivered)
+        ]
+
+    def _ready(self):
+        fresh = self._fresh()
+        live = [is_fresh for is_fresh, stale in zip(fresh, self.stale) if not stale]
+        # With every camera stale, any new frame will do
+        return all(live) if live else any(fresh)
+
+    def capture(self):
+        """Next synchronized batch of frames, one per camera; see `stale` for views that were reused"""
+        with self._cond:
+            self._cond.wait_for(self._ready, self.timeout)
+            fresh = self._fresh()
+            if not any(fresh):
+                raise TimeoutError(f"No new frame from any camera within {self.timeout}s")
+            reference = next(latest[0] for latest, is_fresh in zip(self._latest, fresh) if is_fresh)
+
+            frames, timestamps, previews = [], [], []
+            for i, (latest, is_fresh) in enumerate(zip(self._latest, fresh)):
+                if is_fresh:
+                    frame, timestamp, self._delivered[i], preview = latest
+                    timestamps.append(timestamp)
+                else:
+                    frame = latest[0] if latest is not None else np.zeros_like(reference)
+                    preview = latest[3] if latest is not None else None
+                frames.append(frame)
+                previews.append(preview)
+                if self.stale[i] == is_fresh:
+                    print(f"Camera {self.sources[i].name} " + ("is delivering again" if is_fresh else
+                          f"sent no frame for {self.timeout}s, reusing its last one"))
+                    self.stale[i] = not is_fresh
+            self.previews = previews
+
+        self.skew = max(timestamps) - min(timestamps)
+        return np.stack(frames)
@@ -1,21 +1,25 @@
-import tkinter as tk
-from PIL import Image, ImageTk
-from picamera2 import Picamera2
-from libcamera import controls, Transform
 import time
+# Before anything heavy is imported, for the startup timings
+LAUNCHED = time.perf_counter()
+
+import tkinter as tk
+from PIL import ImageTk
 from tkinter import messagebox
 import os
-import csv
-import numpy as np
-import cv2
-import torch
-import yaml
+import threading
+from asset_cache import load_asset
 
 class SmartCheckout:
     def __init__(self):
         # Initialize variables first
-        self.detected_items = []
+        self.current_detections = []
         self.script_dir = os.path.dirname(os.path.abspath(__file__))
+        # Cameras, model, cart and order store; built in the background, the window only shows them
+        self.engine = None
+        self.engine_error = None
+        self.renderer = None
+        # Order handed to the store's writer thread and not confirmed yet
+        self.pending_order = None
         
         # Setup main window first
         self.root = tk.Tk()
@@ -29,60 +33,31 @@ class SmartCheckout:
         y = (self.root.winfo_screenheight() // 2) - (height // 2)
         self.root.geometry(f'{width}x{height}+{x}+{y}')
 
-        # Initialize camera before setting up GUI
-        self.setup_camera()
-        
-        # Initialize YOLO model
-        self.model = self.load_yolo_model()
-        
         # Setup GUI components
         self.setup_frames()
         self.setup_forms()
         self.setup_buttons()
 
-    def load_yolo_model(self):
-        try:
-            # Update these paths to your trained model and data.yaml
-            weights_path = "runs/train/exp/weights/best.pt"
-            data_yaml = "dataset_config.yaml"
-            
-            # Load class names
-            with open(data_yaml, 'r') as f:
-                self.class_names = yaml.safe_load(f)['names']
-            
-            # Load model
-            model = torch.hub.load('ultralytics/yolov5', 'custom', path=weights_path)
-            model.conf = 0.25  # Confidence threshold
-            print("YOLO model loaded successfully")
-            return model
-        except Exception as e:
-            print(f"Error loading YOLO model: {e}")
-            return None
+        self.window_ready = time.perf_counter()
+        self.last_stats_time = 0
 
-    def setup_camera(self):
+    def setup_engine(self):
+        # Background thread: the cv2/model imports, cameras and model load all happen
+        # here while the form is already usable. Only sets attributes, never touches Tk
         try:
-            self.picam2 = Picamera2()
-            preview_config = self.picam2.create_preview_configuration(
-                main={"size": (640, 480), "format": "RGB888"},
-                transform=Transform(vflip=False, hflip=False)
-            )
-            self.picam2.configure(preview_config)
-            self.picam2.set_controls({"AwbEnable": True})
-            self.picam2.set_controls({"ColourGains": (1.0, 1.0)})
-            self.picam2.start()
-            time.sleep(1)
-            print("Camera initialized successfully")
+            from checkout_engine import CheckoutEngine
+            engine = CheckoutEngine(started=LAUNCHED)
+            engine.mark('window', self.window_ready)
+            engine.start()
+            self.engine = engine
         except Exception as e:
-            print(f"Error initializing camera: {e}")
-            messagebox.showerror("Error", "Failed to initialize camera!")
-            self.root.destroy()
-            exit(1)
+            print(f"Error starting checkout: {e}")
+            self.engine_error = e
 
     def setup_frames(self):
         try:
             # Background
-            bg_image = Image.open(os.path.join(self.script_dir, "assets", "bg_img.jpg"))
-            bg_image = bg_image.resize((1080, 720), Image.Resampling.LANCZOS)
+            bg_image = load_asset(os.path.join(self.script_dir, "assets", "bg_img.jpg"), (1080, 720))
             self.bg = ImageTk.PhotoImage(bg_image)
 
             self.canvas = tk.Canvas(self.root, width=1080, height=720)
@@ -90,26 +65,22 @@ class SmartCheckout:
             self.canvas.create_image(0, 0, image=self.bg, anchor="nw")
 
             # Main frame
-            main_frame = Image.open(os.path.join(self.script_dir, "assets", "main_frame.png"))
-            main_frame = main_frame.resize((1000, 650), Image.Resampling.LANCZOS)
+            main_frame = load_asset(os.path.join(self.script_dir, "assets", "main_frame.png"), (1000, 650))
             self.main_frame_bg = ImageTk.PhotoImage(main_frame)
             self.canvas.create_image(40, 25, image=self.main_frame_bg, anchor="nw")
 
             # Heading frame
-            heading_frame = Image.open(os.path.join(self.script_dir, "assets", "heading_frame.png"))
-            heading_frame = heading_frame.resize((980, 70), Image.Resampling.LANCZOS)
+            heading_frame = load_asset(os.path.join(self.script_dir, "assets", "heading_frame.png"), (980, 70))
             self.heading_frame_bg = ImageTk.PhotoImage(heading_frame)
             self.canvas.create_image(50, 40, image=self.heading_frame_bg, anchor="nw")
 
             # Frame 1 (Customer Details)
-            frame_1 = Image.open(os.path.join(self.script_dir, "assets", "frame_1.png"))
-            frame_1 = frame_1.resize((480, 200), Image.Resampling.LANCZOS)
+            frame_1 = load_asset(os.path.join(self.script_dir, "assets", "frame_1.png"), (480, 200))
             self.frame1_bg = ImageTk.PhotoImage(frame_1)
             self.canvas.create_image(50, 140, image=self.frame1_bg, anchor="nw")
 
             # Frame 2 (Items List)
-            frame_2 = Image.open(os.path.join(self.script_dir, "assets", "frame_2.png"))
-            frame_2 = frame_2.resize((480, 300), Image.Resampling.LANCZOS)
+            frame_2 = load_asset(os.path.join(self.script_dir, "assets", "frame_2.png"), (480, 300))
             self.frame2_bg = ImageTk.PhotoImage(frame_2)
             self.canvas.create_image(50, 360, image=self.frame2_bg, anchor="nw")
 
@@ -117,8 +88,7 @@ class SmartCheckout:
             self.frame_3 = tk.Canvas(self.root, width=480, height=520)
             self.frame_3.place(x=550, y=140)
 
-            frame_3_image = Image.open(os.path.join(self.script_dir, "assets", "frame_3.png"))
-            frame_3_image = frame_3_image.resize((480, 520), Image.Resampling.LANCZOS)
+            frame_3_image = load_asset(os.path.join(self.script_dir, "assets", "frame_3.png"), (480, 520))
             self.frame3_bg = ImageTk.PhotoImage(frame_3_image)
             self.frame_3.create_image(0, 0, image=self.frame3_bg, anchor="nw")
 
@@ -131,6 +101,18 @@ class SmartCheckout:
                 bg='white'
             )
             self.items_listbox.place(x=70, y=380)
+            # Double-click a line to take one of that item off
+            self.items_listbox.bind("<Double-Button-1>", lambda e: self.remove_selected_item())
+            self.listbox_classes = []
+
+            # Running totals below the list
+            self.totals_label = tk.Label(
+                self.root,
+                text="",
+                font=("Arial", 12, "bold"),
+                bg='white'
+            )
+            self.totals_label.place(x=70, y=600)
 
             # Add label above listbox
             self.items_label = tk.Label(
@@ -141,9 +123,23 @@ class SmartCheckout:
             )
             self.items_label.place(x=70, y=355)
 
-            # Create camera label
-            self.camera_label = tk.Label(self.frame_3)
+            # Create camera label; it shows a loading message until the cameras are up
+            self.camera_label = tk.Label(
+                self.frame_3,
+                text="Starting cameras and model...",
+                font=("Arial", 12),
+                bg='white'
+            )
             self.camera_label.place(x=30, y=90, width=420, height=310)
+
+            # Per-stage FPS readout below the camera feed
+            self.fps_label = tk.Label(
+                self.frame_3,
+                text="",
+                font=("Arial", 9),
+                bg='white'
+            )
+            self.fps_label.place(x=30, y=405)
             
         except Exception as e:
             print(f"Error setting up frames: {e}")
@@ -186,12 +182,21 @@ class SmartCheckout:
             relief="groove"
         )
         self.contact_entry.place(x=180, y=240)
+        self.contact_entry.bind("<FocusOut>", lambda e: self.fill_returning_customer())
+
+    def fill_returning_customer(self):
+        """Fill in the name of a returning customer from their contact number"""
+        contact = self.contact_entry.get().strip()
+        if self.engine is None or self.name_entry.get().strip() or not contact.isdigit():
+            return
+        name = self.engine.orders.customer_name(contact)
+        if name:
+            self.name_entry.insert(0, name)
 
     def setup_buttons(self):
         try:
             # Submit button
-            submit_button = Image.open(os.path.join(self.script_dir, "assets", "Submit_button.png"))
-            submit_button = submit_button.resize((100, 35), Image.Resampling.LANCZOS)
+            submit_button = load_asset(os.path.join(self.script_dir, "assets", "Submit_button.png"), (100, 35))
             self.submit_bg = ImageTk.PhotoImage(submit_button)
             self.sbutton = tk.Button(
                 self.root,
@@ -202,8 +207,7 @@ class SmartCheckout:
             self.sbutton.place(x=70, y=290)
 
             # Reset button
-            reset_button = Image.open(os.path.join(self.script_dir, "assets", "Reset_button.png"))
-            reset_button = reset_button.resize((100, 35), Image.Resampling.LANCZOS)
+            reset_button = load_asset(os.path.join(self.script_dir, "assets", "Reset_button.png"), (100, 35))
             self.reset_bg = ImageTk.PhotoImage(reset_button)
             self.rbutton = tk.Button(
                 self.root,
@@ -214,8 +218,7 @@ class SmartCheckout:
             self.rbutton.place(x=180, y=290)
 
             # Add item button
-            add_button = Image.open(os.path.join(self.script_dir, "assets", "Add_button.png"))
-            add_button = add_button.resize((150, 50), Image.Resampling.LANCZOS)
+            add_button = load_asset(os.path.join(self.script_dir, "assets", "Add_button.png"), (150, 50))
             self.add_bg = ImageTk.PhotoImage(add_button)
             self.abutton = tk.Button(
                 self.root,
@@ -230,143 +233,158 @@ class SmartCheckout:
             messagebox.showerror("Error", "Failed to setup buttons!")
             self.cleanup()
 
-    def detect_objects(self, frame):
-        if self.model is None:
-            return []
-        
-        try:
-            # Run inference
-            results = self.model(frame)
-            
-            # Process results
-            detections = []
-            if len(results.pred[0]):
-                for *xyxy, conf, cls in results.pred[0]:
-                    class_id = int(cls)
-                    confidence = float(conf)
-                    class_name = self.class_names[class_id]
-                    detections.append({
-                        'class': class_name,
-                        'confidence': confidence,
-                        'bbox': [int(x) for x in xyxy]
-                    })
-            
-            return detections
-        except Exception as e:
-            print(f"Error in object detection: {e}")
-            return []
-
-    def draw_detections(self, frame, detections):
-        try:
-            img = frame.copy()
-            for det in detections:
-                x1, y1, x2, y2 = det['bbox']
-                cv2.rectangle(img, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                label = f"{det['class']} {det['confidence']:.2f}"
-                cv2.putText(img, label, (x1, y1-10), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-            return img
-        except Exception as e:
-            print(f"Error drawing detections: {e}")
-            return frame
-
     def show_camera(self):
         try:
-            # Capture frame
-            frame = self.picam2.capture_array()
-            
-            # Run detection
-            detections = self.detect_objects(frame)
-            
-            # Store latest detections
-            self.current_detections = detections
-            
-            # Draw detections
-            frame = self.draw_detections(frame, detections)
-            
-            # Convert to PIL Image
-            img = Image.fromarray(frame)
-            img = img.resize((420, 310), Image.Resampling.LANCZOS)
-            
-            # Convert to PhotoImage
-            imgtk = ImageTk.PhotoImage(image=img)
-            
-            # Update camera label
-            self.camera_label.imgtk = imgtk
-            self.camera_label.configure(image=imgtk)
-            
+            if self.renderer is None:
+                if not self.wait_for_cameras():
+                    return
+            else:
+                # Latest frame from the capture thread, if one has arrived
+                frames = self.engine.pipeline.get_display_frame()
+
+                if frames is not None:
+                    # Overlay whatever the inference worker produced last, per camera,
+                    # into the reused display buffer; render() pastes it into the label's image
+                    self.current_detections = self.engine.pipeline.detections
+                    self.renderer.render(frames, self.current_detections, self.engine.cameras.previews)
+                    self.engine.mark('first display')
+
+            self.update_fps_label()
+
             # Schedule next update
             self.camera_label.after(10, self.show_camera)
-            
+
         except Exception as e:
             print(f"Error in camera feed: {e}")
             self.camera_label.after(1000, self.show_camera)  # Retry after 1 second
 
+    def wait_for_cameras(self):
+        """Loading state until the cameras are up, then switch the label to the live image; False on failure"""
+        engine = self.engine
+        error = self.engine_error or (engine.error if engine is not None else None)
+        if error is not None:
+            messagebox.showerror("Error", "Failed to initialize camera!")
+            self.cleanup()
+            return False
+        if engine is None or not engine.cameras_ready.is_set():
+            return True
+
+        # Shows one PhotoImage that is updated in place
+        from frame_overlay import DisplayRenderer
+        self.renderer = DisplayRenderer(len(engine.cameras.sources))
+        self.camera_label.configure(image=self.renderer.photo_image(), text="")
+        return True
+
+    def update_fps_label(self):
+        if self.engine is None:
+            return
+        now = time.time()
+        if now - self.last_stats_time < 1:
+            return
+        self.last_stats_time = now
+
+        # Prices edited while running: totals are rebuilt once, not per frame
+        if self.engine.reload_catalogue():
+            self.refresh_items_listbox()
+
+        self.fps_label.configure(text=self.engine.status_text())
+
     def add_detected_item(self):
-        if hasattr(self, 'current_detections') and self.current_detections:
-            for detection in self.current_detections:
-                item = f"{detection['class']} ({detection['confidence']:.2f})"
-                if item not in self.detected_items:
-                    self.detected_items.append(item)
-                    self.items_listbox.insert(tk.END, item)
+        # Items added while an order is saving would be cleared with it
+        if self.pending_order is not None:
+            return
+        if self.engine is not None and self.engine.add_detected_items(self.current_detections):
+            self.refresh_items_listbox()
+
+    def refresh_items_listbox(self):
+        self.items_listbox.delete(0, tk.END)
+        self.listbox_classes = []
+        unpriced = self.engine.unpriced_items()
+        for class_name, quantity, product in self.engine.cart.priced_lines():
+            if product is None:
+                # Not in the catalogue: checkout is refused until it is removed or priced
+                suffix = "  no price" if class_name in unpriced else ""
+                self.items_listbox.insert(tk.END, f"{class_name} x{quantity}{suffix}")
+            else:
+                self.items_listbox.insert(tk.END, f"{product.name} x{quantity}  {product.price * quantity:.2f}")
+            self.listbox_classes.append(class_name)
+
+        totals = self.engine.cart.totals
+        self.totals_label.configure(
+            text=f"Subtotal {totals.subtotal:.2f}  Tax {totals.tax:.2f}  Total {totals.total:.2f}"
+            + (f"  (excludes {', '.join(unpriced)})" if unpriced else "")
+            if len(self.engine.cart) else ""
+        )
+
+    def remove_selected_item(self):
+        selection = self.items_listbox.curselection()
+        if selection and self.engine.cart.remove(self.listbox_classes[selection[0]]):
+            self.refresh_items_listbox()
 
     def submit_action(self):
         name = self.name_entry.get().strip()
         contact = self.contact_entry.get().strip()
         
-        if not name or not contact:
-            messagebox.showerror("Error", "Please fill in all fields!")
+        if self.engine is None:
+            messagebox.showwarning("Warning", "Still starting up, please wait a moment!")
             return
         
-        if not contact.isdigit() or len(contact) != 10:
-            messagebox.showerror("Error", "Please enter a valid 10-digit contact number!")
+        problem = self.engine.order_problem(name, contact)
+        if problem:
+            messagebox.showerror("Error", problem)
             return
         
-        if not self.detected_items:
-            messagebox.showwarning("Warning", "No items have been added!")
+        if self.pending_order is not None:
+            messagebox.showwarning("Warning", "Still saving the previous order, please wait a moment!")
             return
         
         try:
-            # Save to CSV with detected items
-            csv_file = self.initialize_csv()
-            with open(csv_file, 'a', newline='') as file:
-                writer = csv.writer(file)
-                items_str = ', '.join(self.detected_items)
-                writer.writerow([name, contact, items_str])
-            
-            messagebox.showinfo("Success", "Details and items saved successfully!")
-            self.reset_action()
+            # Queued for the order store's writer thread; the UI does not wait for the disk
+            self.pending_order = self.engine.submit_order(name, contact)
+            self.sbutton.configure(state=tk.DISABLED)
+            self.abutton.configure(state=tk.DISABLED)
+            self.root.after(50, self.check_order_saved)
             
         except Exception as e:
-            print(f"Error saving to CSV: {e}")
+            print(f"Error saving order: {e}")
             messagebox.showerror("Error", "Failed to save details!")
 
+    def check_order_saved(self):
+        # Polled from the Tk thread; the writer thread never touches the window
+        if not self.pending_order.done():
+            self.root.after(50, self.check_order_saved)
+            return
+        future, self.pending_order = self.pending_order, None
+        self.sbutton.configure(state=tk.NORMAL)
+        self.abutton.configure(state=tk.NORMAL)
+        
+        if future.exception() is not None:
+            # The cart is kept so the order can be submitted again
+            messagebox.showerror("Error", "Failed to save details! Your items are still in the cart, please try again.")
+            return
+        messagebox.showinfo("Success", "Details and items saved successfully!")
+        self.reset_action()
+
     def reset_action(self):
         self.name_entry.delete(0, tk.END)
         self.contact_entry.delete(0, tk.END)
-        self.items_listbox.delete(0, tk.END)
-        self.detected_items = []
+        if self.engine is not None:
+            self.engine.cart.clear()
+            self.refresh_items_listbox()
         self.name_entry.focus()
 
-    def initialize_csv(self):
-        csv_file = os.path.join(self.script_dir, "customer_details.csv")
-        if not os.path.exists(csv_file):
-            with open(csv_file, 'w', newline='') as file:
-                writer = csv.writer(file)
-                writer.writerow(["Name", "Contact", "Items"])
-        return csv_file
-
     def cleanup(self):
         try:
-            if hasattr(self, 'picam2'):
-                self.picam2.stop()
+            if self.engine is not None:
+                self.engine.stop()
             self.root.destroy()
         except Exception as e:
             print(f"Error during cleanup: {e}")
 
     def run(self):
         try:
-            # Start camera feed
+            # Cameras and model come up in the background while the window is already shown
+            threading.Thread(target=self.setup_engine, name="engine-init", daemon=True).start()
             self.show_camera()
             
             # Bind cleanup
@@ -0,0 +1,26 @@
+import os
+
+import yaml
+
+# Per-cart settings (ROIs, thresholds); override the location with $CHECKOUT_CONFIG.
+# Next to the code, not the working directory, so the app can be started from anywhere
+CONFIG_PATH = os.environ.get(
+    "CHECKOUT_CONFIG", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cart_config.yaml")
+)
+
+def load_cart_config(path=CONFIG_PATH):
+    """Cart settings as a dict; empty when the file does not exist yet"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return yaml.safe_load(f) or {}
+
+def save_cart_section(section, value, path=CONFIG_PATH):
+    """Replace one top-level section of the config, keeping the others"""
+    config = load_cart_config(path)
+    config[section] = value
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as f:
+        yaml.safe_dump(config, f, sort_keys=False)
+    os.replace(temp_path, path)
+    return config
@@ -0,0 +1,92 @@
+from collections import Counter
+
+from product_catalogue import CartTotals
+
+
+class Cart:
+    """
+    Cart contents keyed by tracker ID, so each physical item counts once.
+
+    With several cameras every view has its own tracker, so the same item
+    gets one ID per camera. Views are fused per class: the cart holds as
+    many of a class as the camera that has seen the most of them. An item
+    that only one camera can see still counts, and one seen by every
+    camera is not counted twice.
+
+    With a catalogue, `totals` is kept up to date as each item is added or
+    removed rather than summed over the cart.
+    """
+
+    def __init__(self, catalogue=None):
+        self.catalogue = catalogue
+        self.view_items = {}  # view -> {track_id: class_name}
+        self.quantities = Counter()
+        self.removed = Counter()  # Items taken off by hand, so re-seen tracks do not re-add them
+        self.totals = CartTotals()
+
+    def add_tracks(self, detections, view=0):
+        """Add tracked detections not already in the cart, return the new class names"""
+        return self.add_views({view: detections})
+
+    def add_views(self, views):
+        """Add tracked detections from several cameras ({view: detections}), return the new class names"""
+        for view, detections in views.items():
+            items = self.view_items.setdefault(view, {})
+            for det in detections:
+                track_id = det.get('track_id')
+                if track_id is not None and track_id not in items:
+                    items[track_id] = det['class']
+
+        # Largest per-view count of each class
+        fused = Counter()
+        for items in self.view_items.values():
+            for class_name, count in Counter(items.values()).items():
+                fused[class_name] = max(fused[class_name], count)
+
+        added = []
+        for class_name, count in fused.items():
+            count -= self.removed[class_name]
+            if count > self.quantities[class_name]:
+                extra = count - self.quantities[class_name]
+                added.extend([class_name] * extra)
+                self.quantities[class_name] = count
+                self.totals.add(self.product(class_name), extra)
+        return added
+
+    def remove(self, class_name, quantity=1):
+        """Take items off by hand; returns how many were removed"""
+        quantity = min(quantity, self.quantities[class_name])
+        if quantity > 0:
+            self.quantities[class_name] -= quantity
+            self.removed[class_name] += quantity
+            self.totals.remove(self.product(class_name), quantity)
+        return quantity
+
+    def product(self, class_name):
+        return self.catalogue.lookup(class_name) if self.catalogue else None
+
+    def recompute_totals(self):
+        """Rebuild totals from scratch, e.g. after the catalogue's prices changed"""
+        self.totals = CartTotals()
+        for class_name, quantity in self.quantities.items():
+            self.totals.add(self.product(class_name), quantity)
+
+    def lines(self):
+        """(class_name, quantity) pairs in the order items were first added"""
+        return [(name, qty) for name, qty in self.quantities.items() if qty > 0]
+
+    def priced_lines(self):
+        """(class_name, quantity, product or None) for billing"""
+        return [(name, qty, self.product(name)) for name, qty in self.lines()]
+
+    def clear(self):
+        self.view_items = {}
+        self.quantities = Counter()
+        self.removed = Counter()
+        self.totals = CartTotals()
+
+    def __len__(self):
+        return sum(self.quantities.values())
+
+    def __str__(self):
+        return ', '.join(f"{name} x{qty}" for name, qty in self.lines())
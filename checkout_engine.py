@@ -0,0 +1,354 @@
+import os
+import threading
+import time
+
+import numpy as np
+import yaml
+
+from inference_backends import load_backend, predictions_to_detections
+from frame_overlay import preview_size
+from camera_sources import FRAME_SIZE, MultiCameraCapture, open_sources
+from frame_pipeline import FramePipeline, InferenceScheduler
+from object_tracker import ObjectTracker
+from temporal_filter import TemporalFilter
+from checkout_cart import Cart
+from cart_config import load_cart_config
+from roi import RegionDetector, RegionSelector
+from order_store import OrderStore, import_csv
+from product_catalogue import ProductCatalogue
+from sync_agent import SyncAgent
+
+class CheckoutEngine:
+    """
+    Cameras, detection, cart and orders, with no UI attached.
+
+    The Tk window (cartItems_model_integrated.py) and the headless web
+    service (checkout_service.py) both drive one of these. The constructor
+    only opens the cart, catalogue and order store. start() opens the
+    cameras and loads the model on two threads at once: capture begins
+    (`cameras_ready`) as soon as the cameras deliver frames, and detection
+    once the model has been warmed up (`model_ready`). Until then `model`
+    is None and frames go through without detections. `pipeline` hands out
+    the latest frames and detections, and the cart is changed only through
+    the methods below from whichever thread owns the UI.
+
+    `timings` records seconds from `started` (the launch) to each startup
+    milestone, including the first captured frame and first detection.
+    """
+
+    def __init__(self, camera_specs=None, display_size=None, started=None):
+        self.started = started or time.perf_counter()
+        self.timings = {}
+        self.script_dir = os.path.dirname(os.path.abspath(__file__))
+        # Class names of the model, shared by the catalogue and the detector
+        self.data_yaml = os.path.join(self.script_dir, "dataset_config.yaml")
+        self.config = load_cart_config()
+        self.orders = self.open_order_store()
+        self.sync_agent = self.start_sync_agent()
+        self.catalogue = self.load_catalogue()
+        self.cart = Cart(self.catalogue)
+
+        # Comma-separated cameras, e.g. "picam:0,usb:0" for a second angle on the cart
+        self.camera_specs = camera_specs or os.environ.get("CHECKOUT_CAMERAS", "picam:0")
+        self.display_size = display_size
+        self.cameras = None
+        self.pipeline = None
+        self.model = None
+        self.error = None
+        self.cameras_ready = threading.Event()
+        self.model_ready = threading.Event()
+        self._init_threads = []
+
+        # Capture and inference run on their own threads
+        self.scheduler = InferenceScheduler(max_interval=15, motion_threshold=6.0)
+        self.mark('engine')
+
+    def mark(self, milestone, at=None):
+        """Record when a startup milestone was first reached"""
+        if milestone not in self.timings:
+            self.timings[milestone] = (at or time.perf_counter()) - self.started
+
+    def startup_report(self):
+        milestones = sorted(self.timings.items(), key=lambda item: item[1])
+        return ", ".join(f"{milestone} {seconds:.2f}s" for milestone, seconds in milestones)
+
+    def load_catalogue(self):
+        try:
+            with open(self.data_yaml, 'r') as f:
+                class_names = yaml.safe_load(f)['names']
+            catalogue = ProductCatalogue(class_names=class_names)
+            print(f"Catalogue loaded: {len(catalogue.products)} products")
+            return catalogue
+        except Exception as e:
+            print(f"Error loading catalogue: {e}")
+            return None
+
+    def open_order_store(self):
+        db_path = os.path.join(self.script_dir, "orders.sqlite")
+        csv_path = os.path.join(self.script_dir, "customer_details.csv")
+        is_new = not os.path.exists(db_path)
+        store = OrderStore(db_path)
+        # Carry over checkouts saved by the old CSV version once
+        if is_new and os.path.exists(csv_path):
+            print(f"Imported {import_csv(store, csv_path)} orders from {csv_path}")
+        return store
+
+    def start_sync_agent(self):
+        # Upload orders to the central service when one is configured; offline carts keep them queued
+        sync_config = self.config.get('sync') or {}
+        if not sync_config.get('endpoint'):
+            return None
+        agent = SyncAgent(
+            self.orders,
+            sync_config['endpoint'],
+            cart_id=sync_config.get('cart_id'),
+            batch_size=sync_config.get('batch_size', 100),
+            interval=sync_config.get('interval', 30),
+            api_key=os.environ.get("CHECKOUT_SYNC_KEY")
+        )
+        agent.start()
+        print(f"Syncing orders to {agent.endpoint} as {agent.cart_id}")
+        return agent
+
+    def load_yolo_model(self, batch_size=1):
+        try:
+            # Update these paths to your trained model and data.yaml
+            weights_path = "runs/train/exp/weights/best.pt"
+            # 'auto' prefers best.onnx next to the weights when it has been exported,
+            # 'int8' loads the quantized best_int8.onnx
+            backend_name = os.environ.get("CHECKOUT_BACKEND", "auto")
+
+            # Load class names
+            with open(self.data_yaml, 'r') as f:
+                self.class_names = yaml.safe_load(f)['names']
+
+            # Load model
+            # Per-frame threshold can sit low; TemporalFilter applies the per-class ones
+            inference_config = self.config.get('inference', {})
+            backend = load_backend(
+                backend_name, weights_path,
+                conf_threshold=inference_config.get('conf_threshold', 0.25),
+                img_size=inference_config.get('img_size', 640)
+            )
+            print(f"YOLO model loaded successfully ({backend.name} backend)")
+            self.warm_up(backend, batch_size)
+
+            # Only the calibrated basket area, and the parts of it that moved, reach the model
+            self.region_selector = RegionSelector(self.config.get('roi'))
+            return RegionDetector(backend, self.region_selector)
+        except Exception as e:
+            print(f"Error loading YOLO model: {e}")
+            return None
+
+    def warm_up(self, backend, batch_size=1):
+        """
+        Run the model once on blank frames, so the first real detection does
+        not also pay for lazy allocation and kernel selection
+        """
+        started = time.perf_counter()
+        blank = np.zeros((batch_size, FRAME_SIZE[1], FRAME_SIZE[0], 3), dtype=np.uint8)
+        backend.predict_batch(list(blank))
+        print(f"Model warmed up in {time.perf_counter() - started:.2f}s")
+
+    def setup_camera(self, camera_specs, display_size=None, timeout=5.0):
+        """Open and start the cameras; raises if any of them cannot be opened"""
+        # Pi cameras also deliver a lores stream already at the display cell size
+        if display_size is None:
+            cell_size = preview_size
+        else:
+            cell_size = lambda num_views: preview_size(num_views, display_size)
+        self.cameras = MultiCameraCapture(open_sources(camera_specs, preview_size=cell_size))
+        # One tracker per view; the cart fuses them
+        self.trackers = [ObjectTracker() for _ in self.cameras.sources]
+        self.filters = [TemporalFilter.from_config(self.config.get('smoothing')) for _ in self.cameras.sources]
+        self.cameras.start()
+        # Wait for the first frames instead of a fixed delay
+        deadline = time.perf_counter() + timeout
+        while True:
+            try:
+                self.cameras.capture()
+                break
+            except TimeoutError:
+                if time.perf_counter() > deadline:
+                    raise
+        print(f"Cameras initialized successfully: {', '.join(self.cameras.names)}")
+
+    def start(self):
+        """Bring up cameras and model in the background; returns at once"""
+        self._init_threads = [
+            threading.Thread(target=self._start_cameras, name="camera-init", daemon=True),
+            threading.Thread(target=self._start_model, name="model-init", daemon=True)
+        ]
+        for thread in self._init_threads:
+            thread.start()
+
+    def _start_cameras(self):
+        try:
+            self.setup_camera(self.camera_specs, self.display_size)
+            self.pipeline = FramePipeline(
+                self.capture_frames,
+                self.track_objects,
+                scheduler=self.scheduler
+            )
+            self.pipeline.start()
+            self.mark('cameras')
+            print(f"Startup: {self.startup_report()}")
+        except Exception as e:
+            print(f"Error initializing camera: {e}")
+            self.error = e
+        finally:
+            self.cameras_ready.set()
+
+    def _start_model(self):
+        batch_size = len([spec for spec in self.camera_specs.split(',') if spec.strip()])
+        model = self.load_yolo_model(batch_size)
+        # Detection starts with the next frame; don't let the scheduler sit on an unchanged scene
+        self.model = model
+        self.scheduler.reset()
+        self.mark('model')
+        self.model_ready.set()
+        print(f"Startup: {self.startup_report()}" + (" (no model)" if model is None else ""))
+
+    def wait_cameras(self, timeout=None):
+        """Block until the cameras are up; raises the error if they could not be opened"""
+        self.cameras_ready.wait(timeout)
+        if self.error is not None:
+            raise self.error
+        return self.cameras_ready.is_set()
+
+    def capture_frames(self):
+        frames = self.cameras.capture()
+        self.mark('first frame')
+        return frames
+
+    def detect_objects(self, frames):
+        """Detections for each camera view, from one batched model call"""
+        if self.model is None:
+            return [[] for _ in frames]
+
+        try:
+            # Run inference
+            predictions = self.model.predict_batch(frames)
+
+            # Process results
+            return [predictions_to_detections(p, self.class_names) for p in predictions]
+        except Exception as e:
+            print(f"Error in object detection: {e}")
+            return [[] for _ in frames]
+
+    def track_objects(self, frames):
+        # Stable IDs across frames so the cart can count physical items, and only
+        # objects seen consistently over several runs are passed on
+        detections_per_view = self.detect_objects(frames)
+        if self.model is not None and 'first detection' not in self.timings:
+            self.mark('first detection')
+            print(f"Startup: {self.startup_report()}")
+        # A stale view is a repeat of an old frame; let its tracks age out instead of re-counting them
+        stale = self.cameras.stale
+        return [
+            temporal_filter.update(tracker.update([] if is_stale else detections))
+            for tracker, temporal_filter, detections, is_stale
+            in zip(self.trackers, self.filters, detections_per_view, stale)
+        ]
+
+    def add_detected_items(self, detections=None):
+        """Add the latest tracked detections of every camera to the cart, return the new class names"""
+        if detections is None:
+            detections = self.pipeline.detections if self.pipeline is not None else []
+        if not detections:
+            return []
+        return self.cart.add_views(dict(enumerate(detections)))
+
+    def reload_catalogue(self):
+        """Pick up edited prices; True if the cart totals changed"""
+        if self.catalogue is not None and self.catalogue.reload_if_changed():
+            self.cart.recompute_totals()
+            return True
+        return False
+
+    def order_problem(self, name, contact):
+        """Why an order cannot be placed yet, or None"""
+        if not name or not contact:
+            return "Please fill in all fields!"
+        if not contact.isdigit() or len(contact) != 10:
+            return "Please enter a valid 10-digit contact number!"
+        if not len(self.cart):
+            return "No items have been added!"
+        unpriced = self.unpriced_items()
+        if unpriced:
+            return f"No price for {', '.join(unpriced)}! Remove it or add it to the catalogue."
+        return None
+
+    def unpriced_items(self):
+        """Classes in the cart that the catalogue has no product for (none without a catalogue)"""
+        if self.catalogue is None:
+            return []
+        return [class_name for class_name, _, product in self.cart.priced_lines() if product is None]
+
+    def submit_order(self, name, contact):
+        """
+        Queue the cart as an order. Returns a Future for the order id; the
+        caller does not wait for the disk, and empties the cart only once the
+        Future resolves, so a failed write keeps the customer's items.
+        """
+        lines = [
+            (class_name, quantity, product.sku, product.price) if product else (class_name, quantity)
+            for class_name, quantity, product in self.cart.priced_lines()
+        ]
+        total = self.cart.totals.total if self.catalogue is not None else None
+        future = self.orders.submit(name, contact, lines, total=total)
+        future.add_done_callback(self.order_saved)
+        return future
+
+    def order_saved(self, future):
+        # Runs on the writer thread; only log
+        if future.exception() is not None:
+            print(f"Error saving order: {future.exception()}")
+
+    def cart_state(self):
+        """The cart as JSON-friendly dicts, money as strings"""
+        lines = []
+        for class_name, quantity, product in self.cart.priced_lines():
+            lines.append({
+                'class': class_name,
+                'name': product.name if product else class_name,
+                'sku': product.sku if product else None,
+                'quantity': quantity,
+                'unit_price': str(product.price) if product else None,
+                'amount': str(product.price * quantity) if product else None
+            })
+        totals = self.cart.totals
+        return {
+            'lines': lines,
+            'count': len(self.cart),
+            'subtotal': str(totals.subtotal),
+            'tax': str(totals.tax),
+            'total': str(totals.total),
+            'unpriced': self.unpriced_items()
+        }
+
+    def status_text(self):
+        if self.pipeline is None:
+            return "Starting cameras..."
+        if not self.model_ready.is_set():
+            return "Model loading... (camera running)"
+        stats = self.pipeline.stats()
+        roi_ratio = self.model.pixel_ratio if self.model is not None else 1.0
+        stale = [name for name, is_stale in zip(self.cameras.names, self.cameras.stale) if is_stale]
+        return (
+            f"Camera {stats['capture']:.1f} | Detect {stats['inference']:.1f} | "
+            f"Display {stats['display']:.1f} FPS | "
+            f"Skipped {self.scheduler.skip_ratio:.0%} | ROI {roi_ratio:.0%}"
+        ) + (f" | No signal: {', '.join(stale)}" if stale else "")
+
+    def stop(self):
+        # Let a camera still opening finish, so it is closed below
+        for thread in self._init_threads:
+            thread.join(5.0)
+        if self.pipeline is not None:
+            self.pipeline.stop()
+        if self.cameras is not None:
+            self.cameras.stop()
+        if self.sync_agent is not None:
+            self.sync_agent.stop()
+        self.orders.close()
@@ -0,0 +1,341 @@
+"""
+Headless checkout: cameras, detection and the cart without Tk, served to a browser.
+
+    python checkout_service.py --port 8080 --cameras picam:0
+
+Serves only this machine by default. To reach it from another device, bind
+wider with a token set, open /?token=<token> once, and the page keeps it as
+a cookie:
+
+    CHECKOUT_SERVICE_TOKEN=... python checkout_service.py --host 0.0.0.0
+
+    GET  /               cart.html
+    GET  /stream.mjpg    annotated camera preview (MJPEG)
+    GET  /events         cart and status updates (server-sent events)
+    GET  /api/cart       cart as JSON
+    GET  /api/customer?contact=...
+    POST /api/cart/add   add what the cameras currently see
+    POST /api/cart/remove  {"class": "maggi"}
+    POST /api/cart/clear
+    POST /api/checkout   {"name": ..., "contact": ...}
+"""
+import argparse
+import asyncio
+import hmac
+import ipaddress
+import json
+import os
+import time
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qs, urlsplit
+
+import cv2
+import numpy as np
+
+from frame_overlay import DisplayRenderer
+from checkout_engine import CheckoutEngine
+
+STREAM_SIZE = (640, 480)
+BOUNDARY = "frame"
+# Files the page needs; nothing else on disk is served
+STATIC_FILES = {
+    '/': ('cart.html', 'text/html; charset=utf-8'),
+    '/cart.html': ('cart.html', 'text/html; charset=utf-8'),
+    '/cart_style.css': ('cart_style.css', 'text/css'),
+    '/assets/bg_img.jpg': (os.path.join('assets', 'bg_img.jpg'), 'image/jpeg')
+}
+REASONS = {
+    200: "OK", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found", 405: "Method Not Allowed",
+    409: "Conflict", 500: "Internal Server Error"
+}
+TOKEN_COOKIE = "checkout_token"
+
+def is_loopback(host):
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return host == 'localhost'
+
+class Broadcast:
+    """
+    Latest value of something many clients watch.
+
+    publish() replaces the value and wakes every subscriber; a subscriber
+    that is slower than the publisher skips straight to the newest value
+    instead of queueing old ones, so one slow viewer never holds up the
+    others or grows memory.
+    """
+
+    def __init__(self):
+        self.value = None
+        self.sequence = 0
+        self.subscribers = 0
+        self._cond = asyncio.Condition()
+
+    async def publish(self, value):
+        async with self._cond:
+            self.value = value
+            self.sequence += 1
+            self._cond.notify_all()
+
+    async def subscribe(self):
+        self.subscribers += 1
+        try:
+            seen = 0
+            while True:
+                async with self._cond:
+                    await self._cond.wait_for(lambda: self.sequence > seen)
+                    seen, value = self.sequence, self.value
+                yield value
+        finally:
+            self.subscribers -= 1
+
+class CheckoutService:
+    """
+    Serves one CheckoutEngine over HTTP on an asyncio event loop.
+
+    The preview is rendered and JPEG-encoded once per camera frame, off the
+    loop in a worker thread, and only while at least one viewer is
+    connected; every viewer is sent the same bytes. Cart and status updates
+    are likewise serialised once and fanned out as server-sent events. The
+    cart is only touched from the event loop.
+
+    With a `token`, every request must carry it as a Bearer header, a
+    ?token= query or the cookie set by the first request that used the query.
+    """
+
+    def __init__(self, engine, fps=15, quality=80, size=STREAM_SIZE, token=None):
+        self.engine = engine
+        self.token = token
+        self.checkout_pending = False
+        self.fps = fps
+        self.quality = quality
+        self.renderer = DisplayRenderer(len(engine.cameras.sources), size)
+        self.bgr = np.empty((size[1], size[0], 3), dtype=np.uint8)
+        self.frames = Broadcast()
+        self.events = Broadcast()
+        self.encoded = 0
+
+    def encode_frame(self, frames, detections):
+        """Overlay and JPEG-encode one set of camera frames (worker thread)"""
+        self.renderer.render(frames, detections, self.engine.cameras.previews)
+        cv2.cvtColor(self.renderer.buffer, cv2.COLOR_RGBA2BGR, dst=self.bgr)
+        ok, jpeg = cv2.imencode('.jpg', self.bgr, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            raise ValueError("JPEG encoding failed")
+        self.encoded += 1
+        return (
+            f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(jpeg)}\r\n\r\n".encode()
+            + jpeg.tobytes() + b"\r\n"
+        )
+
+    async def encode_loop(self):
+        loop = asyncio.get_running_loop()
+        interval = 1 / self.fps
+        while True:
+            started = time.perf_counter()
+            frames = self.engine.pipeline.get_display_frame() if self.frames.subscribers else None
+            if frames is not None:
+                try:
+                    chunk = await loop.run_in_executor(
+                        None, self.encode_frame, frames, self.engine.pipeline.detections
+                    )
+                    await self.frames.publish(chunk)
+                except Exception as e:
+                    print(f"Error encoding preview: {e}")
+            await asyncio.sleep(max(0.005, interval - (time.perf_counter() - started)))
+
+    def state(self):
+        state = self.engine.cart_state()
+        state['detected'] = sorted({
+            det['class'] for detections in self.engine.pipeline.detections for det in detections
+        })
+        state['status'] = self.engine.status_text()
+        return state
+
+    async def publish_state(self):
+        await self.events.publish(f"data: {json.dumps(self.state())}\n\n".encode())
+
+    async def status_loop(self):
+        # Once a second: pick up price edits, refresh what the cameras see and the FPS line
+        while True:
+            self.engine.reload_catalogue()
+            if self.events.subscribers:
+                await self.publish_state()
+            await asyncio.sleep(1)
+
+    async def handle(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            if not request_line:
+                return
+            method, target, _ = request_line.decode('latin-1').split(' ', 2)
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                key, _, value = line.decode('latin-1').partition(':')
+                headers[key.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get('content-length', 0)))
+            url = urlsplit(target)
+            query = parse_qs(url.query)
+            if not self.authorized(headers, query):
+                await self.respond(writer, 401, {'error': "Missing or wrong token"})
+                return
+            await self.route(method, url.path, query, body, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            print(f"Error handling request: {e}")
+            try:
+                await self.respond(writer, 500, {'error': str(e)})
+            except ConnectionError:
+                pass
+        finally:
+            writer.close()
+
+    def authorized(self, headers, query):
+        if self.token is None:
+            return True
+        cookie = SimpleCookie(headers.get('cookie', ''))
+        offered = [
+            headers.get('authorization', '').removeprefix('Bearer ').strip(),
+            query.get('token', [''])[0],
+            cookie[TOKEN_COOKIE].value if TOKEN_COOKIE in cookie else ''
+        ]
+        return any(value and hmac.compare_digest(value.encode(), self.token.encode()) for value in offered)
+
+    async def route(self, method, path, query, body, writer):
+        if method == 'GET' and path in STATIC_FILES:
+            filename, content_type = STATIC_FILES[path]
+            # Keep the token from the link, so the page's own requests carry it
+            extra_headers = {}
+            if self.token is not None and 'token' in query:
+                extra_headers['Set-Cookie'] = f"{TOKEN_COOKIE}={self.token}; HttpOnly; SameSite=Strict; Path=/"
+            with open(os.path.join(self.engine.script_dir, filename), 'rb') as f:
+                await self.respond(writer, 200, f.read(), content_type, extra_headers)
+        elif method == 'GET' and path == '/stream.mjpg':
+            await self.stream(writer, self.frames, f"multipart/x-mixed-replace; boundary={BOUNDARY}")
+        elif method == 'GET' and path == '/events':
+            await self.publish_state()
+            await self.stream(writer, self.events, "text/event-stream")
+        elif method == 'GET' and path == '/api/cart':
+            await self.respond(writer, 200, self.state())
+        elif method == 'GET' and path == '/api/customer':
+            contact = query.get('contact', [''])[0]
+            await self.respond(writer, 200, {'name': self.engine.orders.customer_name(contact)})
+        elif path.startswith('/api/'):
+            if method != 'POST':
+                await self.respond(writer, 405, {'error': f"{method} not allowed"})
+                return
+            try:
+                data = json.loads(body or b'{}')
+            except ValueError:
+                await self.respond(writer, 400, {'error': "Request body is not valid JSON"})
+                return
+            if not isinstance(data, dict):
+                await self.respond(writer, 400, {'error': "Request body must be a JSON object"})
+                return
+            status, payload = await self.action(path, data)
+            await self.respond(writer, status, payload)
+            await self.publish_state()
+        else:
+            await self.respond(writer, 404, {'error': f"No such page: {path}"})
+
+    async def action(self, path, data):
+        """Cart changes from the page; returns (status, JSON payload)"""
+        if path == '/api/cart/add':
+            if self.checkout_pending:
+                # The cart is cleared once the order is saved, so these items would be lost
+                return 409, {'error': "Still saving the previous order, please wait a moment!"}
+            return 200, dict(self.state(), added=self.engine.add_detected_items())
+        if path == '/api/cart/remove':
+            return 200, dict(self.state(), removed=self.engine.cart.remove(data.get('class')))
+        if path == '/api/cart/clear':
+            self.engine.cart.clear()
+            return 200, self.state()
+        if path == '/api/checkout':
+            name = str(data.get('name', '')).strip()
+            contact = str(data.get('contact', '')).strip()
+            problem = self.engine.order_problem(name, contact)
+            if problem:
+                return 400, {'error': problem}
+            if self.checkout_pending:
+                return 409, {'error': "Still saving the previous order, please wait a moment!"}
+            # The store's writer thread commits it; the loop only awaits the result
+            self.checkout_pending = True
+            try:
+                order_id = await asyncio.wrap_future(self.engine.submit_order(name, contact))
+            except Exception as e:
+                # The cart is kept so the order can be submitted again
+                print(f"Error saving order: {e}")
+                return 500, {'error': "Failed to save details! Your items are still in the cart, please try again."}
+            finally:
+                self.checkout_pending = False
+            self.engine.cart.clear()
+            return 200, {'order_id': order_id}
+        return 404, {'error': f"No such action: {path}"}
+
+    async def respond(self, writer, status, payload, content_type='application/json', extra_headers=None):
+        body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        extra = ''.join(f"{key}: {value}\r\n" for key, value in (extra_headers or {}).items())
+        writer.write(
+            f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: {content_type}\r\n{extra}"
+            f"Content-Length: {len(body)}\r\nCache-Control: no-store\r\nConnection: close\r\n\r\n".encode()
+            + body
+        )
+        await writer.drain()
+
+    async def stream(self, writer, broadcast, content_type):
+        writer.write(
+            f"HTTP/1.1 200 OK\r\nContent-Type: {content_type}\r\n"
+            f"Cache-Control: no-store\r\nConnection: close\r\n\r\n".encode()
+        )
+        async for chunk in broadcast.subscribe():
+            writer.write(chunk)
+            await writer.drain()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port)
+        tasks = [asyncio.create_task(self.encode_loop()), asyncio.create_task(self.status_loop())]
+        print(f"Checkout service on http://{host}:{port}/")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the checkout without a window, served over HTTP")
+    parser.add_argument('--host', default='127.0.0.1',
+                        help="address to serve on; anything but loopback needs $CHECKOUT_SERVICE_TOKEN")
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--cameras', help="camera specs, default $CHECKOUT_CAMERAS or picam:0")
+    parser.add_argument('--fps', type=float, default=15, help="preview stream frame rate cap")
+    parser.add_argument('--quality', type=int, default=80, help="preview JPEG quality")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    # Cart changes and customer lookups must not be open to everyone on the shop's network
+    token = os.environ.get("CHECKOUT_SERVICE_TOKEN") or None
+    if token is None and not is_loopback(args.host):
+        raise SystemExit(f"Refusing to serve on {args.host} without a token; set CHECKOUT_SERVICE_TOKEN")
+    engine = CheckoutEngine(args.cameras, display_size=STREAM_SIZE)
+    try:
+        # The model keeps loading in the background; the page is served as soon as the cameras are up
+        engine.start()
+        engine.wait_cameras()
+        service = CheckoutService(engine, args.fps, args.quality, token=token)
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        print(f"Error running checkout service: {e}")
+    finally:
+        engine.stop()
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,35 @@
 import cv2
 import numpy as np
 import os
+import json
+import time
+import zlib
+import hashlib
+import multiprocessing
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 
-def add_gaussian_noise(image, mean=0, sigma=50):  # Increased sigma from 25 to 50
+def add_gaussian_noise(image, mean=0, sigma=50, rng=None):  # Increased sigma from 25 to 50
     """Add Gaussian noise to an image"""
-    noise = np.random.normal(mean, sigma, image.shape)
-    noisy_image = image + noise
-    return np.clip(noisy_image, 0, 255).astype(np.uint8)
+    rng = rng or np.random.default_rng()
+    # Build the noisy image in one float32 buffer instead of several float64 temporaries
+    noisy_image = rng.standard_normal(image.shape, dtype=np.float32)
+    noisy_image *= sigma
+    noisy_image += mean
+    noisy_image += image
+    np.clip(noisy_image, 0, 255, out=noisy_image)
+    return noisy_image.astype(np.uint8)
 
-def add_salt_pepper_noise(image, prob=0.05):  # Increased probability from 0.02 to 0.05
+def add_salt_pepper_noise(image, prob=0.05, rng=None):  # Increased probability from 0.02 to 0.05
     """Add salt and pepper noise to an image"""
+    rng = rng or np.random.default_rng()
     noisy_image = image.copy()
     # Salt noise
-    salt_mask = np.random.random(image.shape) < prob
+    salt_mask = rng.random(image.shape, dtype=np.float32) < prob
     noisy_image[salt_mask] = 255
     # Pepper noise
-    pepper_mask = np.random.random(image.shape) < prob
+    pepper_mask = rng.random(image.shape, dtype=np.float32) < prob
     noisy_image[pepper_mask] = 0
     return noisy_image
 
@@ -36,61 +49,394 @@ def rotate_image(image, angle):
     rotation_matrix = cv2.getRotationMatrix2D(center, angle, 1.0)
     return cv2.warpAffine(image, rotation_matrix, (width, height))
 
-def preprocess_dataset(input_path, output_path, target_size=(480, 480)):  # Changed size to 480x480
+def rotate_boxes(labels, angle, width, height):
     """
-    Preprocess all images in the dataset with various augmentations
+    Rotate YOLO labels (class, x_center, y_center, w, h normalized) the same
+    way rotate_image does, taking the axis-aligned box around the rotated
+    corners and clipping it to the frame. Boxes rotated out of view are dropped.
+    """
+    if not len(labels):
+        return labels
+
+    xc, yc = labels[:, 1] * width, labels[:, 2] * height
+    half_w, half_h = labels[:, 3] * width / 2, labels[:, 4] * height / 2
+    corners = np.stack([
+        np.stack([xc - half_w, yc - half_h], axis=1),
+        np.stack([xc + half_w, yc - half_h], axis=1),
+        np.stack([xc + half_w, yc + half_h], axis=1),
+        np.stack([xc - half_w, yc + half_h], axis=1)
+    ], axis=1)  # (n, 4, 2)
+
+    rotation_matrix = cv2.getRotationMatrix2D((width // 2, height // 2), angle, 1.0)
+    rotated = corners @ rotation_matrix[:, :2].T + rotation_matrix[:, 2]
+
+    x1 = rotated[:, :, 0].min(axis=1).clip(0, width)
+    x2 = rotated[:, :, 0].max(axis=1).clip(0, width)
+    y1 = rotated[:, :, 1].min(axis=1).clip(0, height)
+    y2 = rotated[:, :, 1].max(axis=1).clip(0, height)
+    visible = ((x2 - x1) > 2) & ((y2 - y1) > 2)
+
+    result = np.stack([
+        labels[:, 0],
+        (x1 + x2) / 2 / width,
+        (y1 + y2) / 2 / height,
+        (x2 - x1) / width,
+        (y2 - y1) / height
+    ], axis=1).astype(np.float32)
+    return result[visible]
+
+# Augmentation name -> (function, parameters); 'original' is the resized source
+AUGMENTATIONS = {
+    'original': (None, {}),
+    'gaussian': (add_gaussian_noise, {}),
+    'gaussian_strong': (add_gaussian_noise, {'sigma': 75}),  # Added stronger gaussian noise
+    'salt_pepper': (add_salt_pepper_noise, {}),
+    'salt_pepper_strong': (add_salt_pepper_noise, {'prob': 0.08}),  # Added stronger salt & pepper noise
+    'bright': (adjust_brightness_contrast, {'brightness': 30}),
+    'dark': (adjust_brightness_contrast, {'brightness': -30}),
+    'contrast': (adjust_brightness_contrast, {'contrast': 1.3}),
+    'blur': (apply_blur, {'kernel_size': 5}),
+    'rotate90': (rotate_image, {'angle': 90}),
+    'rotate180': (rotate_image, {'angle': 180}),
+    'rotate270': (rotate_image, {'angle': 270})
+}
+
+# Augmentations that draw random numbers and need the per-image generator
+RANDOM_AUGMENTATIONS = (add_gaussian_noise, add_salt_pepper_noise)
+
+def apply_augmentation(image, aug_name, rng=None):
+    """Apply one named augmentation from AUGMENTATIONS"""
+    func, params = AUGMENTATIONS[aug_name]
+    if func is None:
+        return image
+    if func in RANDOM_AUGMENTATIONS:
+        return func(image, rng=rng, **params)
+    return func(image, **params)
+
+# Bump when an augmentation function changes so cached outputs are rebuilt
+AUGMENTATION_VERSION = 1
+MANIFEST_NAME = 'augmentation_manifest.json'
+
+def transform_labels(labels, aug_name, width, height):
+    """Move YOLO labels along with an augmentation; only rotations change geometry"""
+    func, params = AUGMENTATIONS[aug_name]
+    if func is rotate_image:
+        return rotate_boxes(labels, params['angle'], width, height)
+    return labels
+
+def split_variant_name(image_path):
+    """Split 'photo_rotate90.jpg' into ('photo', 'rotate90'); unknown suffixes count as 'original'"""
+    stem = os.path.splitext(os.path.basename(image_path))[0]
+    for aug_name in sorted(AUGMENTATIONS, key=len, reverse=True):
+        if stem.endswith(f"_{aug_name}"):
+            return stem[:-len(aug_name) - 1], aug_name
+    return stem, 'original'
+
+def variant_angle(aug_name):
+    func, params = AUGMENTATIONS.get(aug_name, (None, {}))
+    return params['angle'] if func is rotate_image else 0
+
+def group_variants(image_paths):
+    """Group augmented files by source image, keeping the first-seen order"""
+    groups = {}
+    for image_path in sorted(image_paths):
+        source, aug_name = split_variant_name(image_path)
+        groups.setdefault(source, {})[aug_name] = image_path
+    return [{'source': source, 'variants': variants} for source, variants in groups.items()]
+
+def display_variant(variants):
+    """Variant to annotate: the original if present, else any unrotated one"""
+    if 'original' in variants:
+        return 'original'
+    unrotated = [name for name in variants if variant_angle(name) == 0]
+    return unrotated[0] if unrotated else next(iter(variants))
+
+def read_yolo_labels(label_path):
+    """YOLO label file as an (n, 5) float32 array; empty if the file is missing"""
+    if not os.path.exists(label_path):
+        return np.zeros((0, 5), dtype=np.float32)
+    labels = np.loadtxt(label_path, ndmin=2, dtype=np.float32)
+    return labels.reshape(-1, 5)
+
+def image_seed(seed, class_name, img_name):
+    """Seed that depends only on the run seed and the image, not on scheduling"""
+    return [seed, zlib.crc32(f"{class_name}/{img_name}".encode())]
+
+def augmentation_rng(seed, aug_name):
+    # Separate stream per augmentation so any subset can be regenerated on its own
+    return np.random.default_rng([*seed, zlib.crc32(aug_name.encode())])
+
+def augmentation_config_hash(aug_name, target_size, seed):
+    """Hash of everything that determines one augmentation's output besides the source"""
+    func, params = AUGMENTATIONS[aug_name]
+    config = {
+        'version': AUGMENTATION_VERSION,
+        'function': func.__name__ if func else None,
+        'params': params,
+        'target_size': list(target_size),
+        'seed': seed
+    }
+    return hashlib.sha1(json.dumps(config, sort_keys=True).encode()).hexdigest()[:16]
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def output_file(output_class_path, img_name, aug_name):
+    basename = os.path.splitext(img_name)[0]
+    return os.path.join(output_class_path, f"{basename}_{aug_name}.jpg")
+
+def load_manifest(output_path):
+    manifest_path = os.path.join(output_path, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path, 'r') as f:
+            return json.load(f).get('images', {})
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable manifest {manifest_path}: {e}")
+        return {}
+
+def save_manifest(output_path, entries):
+    """Write the manifest atomically so an interrupted run never leaves it half-written"""
+    manifest_path = os.path.join(output_path, MANIFEST_NAME)
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'version': AUGMENTATION_VERSION, 'images': entries}, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+def remove_outputs(output_class_path, img_name, aug_names):
+    for aug_name in aug_names:
+        path = output_file(output_class_path, img_name, aug_name)
+        if os.path.exists(path):
+            os.remove(path)
+
+def _init_worker():
+    # One OpenCV thread per process; parallelism comes from the pool
+    cv2.setNumThreads(1)
+
+def _write_image(path, image):
+    start = time.perf_counter()
+    cv2.imwrite(path, image)
+    return time.perf_counter() - start
+
+def augment_image(img_path, output_class_path, target_size, seed, aug_names=None):
+    """
+    Read, resize and augment one image, writing the requested variants (all by default).
+    Returns stage timings, or None if the image could not be read.
+    """
+    timings = defaultdict(float)
+
+    start = time.perf_counter()
+    image = cv2.imread(img_path)
+    timings['read'] = time.perf_counter() - start
+    if image is None:
+        print(f"Could not read image: {img_path}")
+        return img_path, None
+
+    # Resize image
+    start = time.perf_counter()
+    resized = cv2.resize(image, target_size)
+    timings['resize'] = time.perf_counter() - start
+
+    img_name = os.path.basename(img_path)
+
+    # JPEG encoding runs on a writer thread while the next variant is computed
+    with ThreadPoolExecutor(max_workers=2) as writer:
+        writes = []
+        for aug_name in aug_names or AUGMENTATIONS:
+            start = time.perf_counter()
+            aug_image = apply_augmentation(resized, aug_name, augmentation_rng(seed, aug_name))
+            timings[aug_name] += time.perf_counter() - start
+
+            output_path_full = output_file(output_class_path, img_name, aug_name)
+            writes.append(writer.submit(_write_image, output_path_full, aug_image))
+
+        timings['write'] = sum(write.result() for write in writes)
+
+    return img_path, timings
+
+def print_timings(timings, num_images):
+    total = sum(timings.values())
+    print(f"{'stage':<20} {'total s':>8} {'ms/img':>8} {'share':>6}")
+    for name, seconds in sorted(timings.items(), key=lambda item: -item[1]):
+        share = seconds / total if total else 0
+        print(f"{name:<20} {seconds:8.2f} {1000 * seconds / max(num_images, 1):8.1f} {share:6.1%}")
+
+def preprocess_dataset(input_path, output_path, target_size=(480, 480), seed=0, workers=None):  # Changed size to 480x480
+    """
+    Preprocess all images in the dataset with various augmentations.
+
+    Images are spread over a process pool; output is identical for a given
+    seed. A manifest in output_path records each source's hash and each
+    augmentation's config, so reruns only rebuild new or changed images or
+    configs and drop outputs whose source or augmentation is gone.
     """
     # Create output directory if it doesn't exist
     if not os.path.exists(output_path):
         os.makedirs(output_path)
-    
-    # Process each class folder
-    for class_name in os.listdir(input_path):
+
+    manifest = load_manifest(output_path)
+    new_manifest = {}
+    seen = set()
+    configs = {aug: augmentation_config_hash(aug, target_size, seed) for aug in AUGMENTATIONS}
+
+    # Collect work from every class folder
+    tasks = []
+    for class_name in sorted(os.listdir(input_path)):
         class_path = os.path.join(input_path, class_name)
         if not os.path.isdir(class_path):
             continue
-            
+
         # Create output class directory
         output_class_path = os.path.join(output_path, class_name)
         if not os.path.exists(output_class_path):
             os.makedirs(output_class_path)
-            
-        # Process each image in the class folder
-        images = [f for f in os.listdir(class_path) if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
-        for img_name in tqdm(images, desc=f"Processing {class_name}"):
-            img_path = os.path.join(class_path, img_name)
-            
-            # Read image
-            image = cv2.imread(img_path)
-            if image is None:
-                print(f"Could not read image: {img_path}")
+
+        images = sorted(f for f in os.listdir(class_path) if f.lower().endswith(('.png', '.jpg', '.jpeg')))
+        for img_name in images:
+            key = f"{class_name}/{img_name}"
+            seen.add(key)
+            source_hash = file_hash(os.path.join(class_path, img_name))
+
+            cached = manifest.get(key)
+            if cached:
+                # Augmentations that were removed from AUGMENTATIONS, whether or not the source changed
+                remove_outputs(output_class_path, img_name, set(cached['augmentations']) - set(configs))
+            if cached and cached['source'] == source_hash:
+                todo = [
+                    aug for aug, config in configs.items()
+                    if cached['augmentations'].get(aug) != config
+                    or not os.path.exists(output_file(output_class_path, img_name, aug))
+                ]
+            else:
+                todo = list(configs)
+
+            if not todo:
+                new_manifest[key] = cached
                 continue
-                
-            # Resize image
-            resized = cv2.resize(image, target_size)
-            
-            # Generate augmented versions
-            augmentations = {
-                'original': resized,
-                'gaussian': add_gaussian_noise(resized),
-                'gaussian_strong': add_gaussian_noise(resized, sigma=75),  # Added stronger gaussian noise
-                'salt_pepper': add_salt_pepper_noise(resized),
-                'salt_pepper_strong': add_salt_pepper_noise(resized, prob=0.08),  # Added stronger salt & pepper noise
-                'bright': adjust_brightness_contrast(resized, brightness=30),
-                'dark': adjust_brightness_contrast(resized, brightness=-30),
-                'contrast': adjust_brightness_contrast(resized, contrast=1.3),
-                'blur': apply_blur(resized, kernel_size=5),
-                'rotate90': rotate_image(resized, 90),
-                'rotate180': rotate_image(resized, 180),
-                'rotate270': rotate_image(resized, 270)
-            }
-            
-            # Save all versions
-            basename = os.path.splitext(img_name)[0]
-            for aug_name, aug_image in augmentations.items():
-                output_name = f"{basename}_{aug_name}.jpg"
-                output_path_full = os.path.join(output_class_path, output_name)
-                cv2.imwrite(output_path_full, aug_image)
+
+            tasks.append((
+                key,
+                source_hash,
+                (
+                    os.path.join(class_path, img_name),
+                    output_class_path,
+                    target_size,
+                    image_seed(seed, class_name, img_name),
+                    todo
+                )
+            ))
+
+    # Sources that were deleted since the last run
+    removed = [key for key in manifest if key not in seen]
+    for key in removed:
+        class_name, img_name = key.split('/', 1)
+        remove_outputs(os.path.join(output_path, class_name), img_name, manifest[key]['augmentations'])
+
+    print(f"{len(tasks)} new or changed, {len(new_manifest)} unchanged, {len(removed)} removed")
+
+    timings = defaultdict(float)
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            futures = {pool.submit(augment_image, *task[2]): task for task in tasks}
+            for future in tqdm(as_completed(futures), total=len(futures), desc="Augmenting"):
+                key, source_hash, _ = futures[future]
+                _, image_timings = future.result()
+                if image_timings is None:
+                    continue
+                new_manifest[key] = {'source': source_hash, 'augmentations': configs}
+                for name, seconds in image_timings.items():
+                    timings[name] += seconds
+    finally:
+        # Keep progress even if the run is interrupted
+        save_manifest(output_path, new_manifest)
+
+    print(f"Augmented {len(tasks)} images in {time.perf_counter() - start:.1f}s")
+    print_timings(timings, len(tasks))
+    return timings
+
+class AugmentedDataset:
+    """
+    Applies AUGMENTATIONS lazily at training time instead of writing JPEGs.
+
+    Every (source image, augmentation) pair is one item, so an epoch sees
+    the same 12 variants preprocess_dataset would have written, with the
+    labels transformed to match. Items are (BGR uint8 image, labels) with
+    labels as (n, 5) normalized YOLO rows. It has __len__/__getitem__, so
+    it can be handed straight to a torch DataLoader.
+
+    When the folder already holds materialized variants, each source photo
+    is used once, through the same variant the labeller shows: the original,
+    else an unrotated one, else a rotated one turned back upright together
+    with its labels. The epoch lives in shared memory, so set_epoch()
+    reaches DataLoader workers that outlive an epoch.
+    """
+
+    def __init__(self, images_dir, labels_dir, target_size=(480, 480), aug_names=None, seed=0):
+        self.images_dir = images_dir
+        self.labels_dir = labels_dir
+        self.target_size = target_size
+        self.aug_names = list(aug_names or AUGMENTATIONS)
+        self.seed = seed
+        self._epoch = multiprocessing.Value('i', 0, lock=False)
+
+        image_names = sorted(
+            f for f in os.listdir(images_dir)
+            if f.lower().endswith(('.png', '.jpg', '.jpeg'))
+        )
+        # (file, rotation to undo) per source photo
+        self.sources = []
+        for group in group_variants(image_names):
+            aug_name = display_variant(group['variants'])
+            self.sources.append((group['variants'][aug_name], variant_angle(aug_name)))
+        self.image_names = [img_name for img_name, _ in self.sources]
+
+    @property
+    def epoch(self):
+        return self._epoch.value
+
+    def set_epoch(self, epoch):
+        # New noise every epoch, still reproducible from the seed
+        self._epoch.value = epoch
+
+    def __len__(self):
+        return len(self.image_names) * len(self.aug_names)
+
+    def __getitem__(self, index):
+        image_index, aug_index = divmod(index, len(self.aug_names))
+        img_name, angle = self.sources[image_index]
+        aug_name = self.aug_names[aug_index]
+
+        image = cv2.imread(os.path.join(self.images_dir, img_name))
+        if image is None:
+            raise IOError(f"Could not read image: {img_name}")
+        image = cv2.resize(image, self.target_size)
+
+        label_path = os.path.join(self.labels_dir, os.path.splitext(img_name)[0] + '.txt')
+        labels = read_yolo_labels(label_path)
+        if angle:
+            # Only rotated variants of this photo exist; turn it back upright first
+            image = rotate_image(image, -angle)
+            labels = rotate_boxes(labels, -angle, self.target_size[0], self.target_size[1])
+
+        rng = np.random.default_rng([self.seed, self.epoch, index])
+        image = apply_augmentation(image, aug_name, rng)
+        labels = transform_labels(labels, aug_name, self.target_size[0], self.target_size[1])
+        return image, labels
+
+def stream_augmented(images_dir, labels_dir, target_size=(480, 480), aug_names=None, seed=0, shuffle=True):
+    """Generator over AugmentedDataset items, optionally in shuffled order"""
+    dataset = AugmentedDataset(images_dir, labels_dir, target_size, aug_names, seed)
+    order = np.arange(len(dataset))
+    if shuffle:
+        np.random.default_rng(seed).shuffle(order)
+    for index in order:
+        yield dataset[index]
 
 if __name__ == "__main__":
     # Replace these paths with your actual paths
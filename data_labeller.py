@@ -3,13 +3,172 @@ import cv2
 import tkinter as tk
 from tkinter import messagebox
 from PIL import Image, ImageTk
-import shutil
 from pathlib import Path
 import time
+import json
+import queue
+import itertools
+import threading
 import yaml
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from data_augmentation import rotate_boxes, variant_angle, group_variants, display_variant
+from annotation_index import AnnotationIndex
+from dataset_builder import link_file
+
+BOX_COLORS = ["red", "blue", "green", "magenta", "orange", "cyan", "yellow", "purple"]
+
+def decode_for_display(image_path, max_width, max_height):
+    """Read an image and scale it to fit the canvas. Returns (original (h, w), RGB display array)."""
+    image = cv2.imread(image_path)
+    if image is None:
+        raise IOError(f"Could not read image: {image_path}")
+    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+    # Resize for display
+    height, width = image.shape[:2]
+    scaling = min(max_width/width, max_height/height)
+    new_width, new_height = int(width*scaling), int(height*scaling)
+    return (height, width), cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_AREA)
+
+class DecodedImageCache:
+    """Thread-safe LRU of decoded display images, bounded by total bytes"""
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, image_path):
+        with self.lock:
+            entry = self.entries.get(image_path)
+            if entry is not None:
+                self.entries.move_to_end(image_path)
+            return entry
+
+    def put(self, image_path, entry):
+        with self.lock:
+            if image_path in self.entries:
+                self.size -= self.entries.pop(image_path)[1].nbytes
+            self.entries[image_path] = entry
+            self.size += entry[1].nbytes
+            while self.size > self.max_bytes and len(self.entries) > 1:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= evicted[1].nbytes
+
+    def __contains__(self, image_path):
+        with self.lock:
+            return image_path in self.entries
+
+class ImagePrefetcher:
+    """
+    Decodes images around the cursor on a background thread.
+
+    Each schedule() call replaces the previous wish list, so holding an
+    arrow key only ever works on images near where the cursor is now.
+    """
+
+    def __init__(self, cache, max_width, max_height):
+        self.cache = cache
+        self.max_width = max_width
+        self.max_height = max_height
+        self.wanted = []
+        self.condition = threading.Condition()
+        threading.Thread(target=self._worker, daemon=True).start()
+
+    def schedule(self, image_paths):
+        with self.condition:
+            self.wanted = [path for path in image_paths if path not in self.cache]
+            self.condition.notify()
+
+    def _worker(self):
+        while True:
+            with self.condition:
+                while not self.wanted:
+                    self.condition.wait()
+                image_path = self.wanted.pop(0)
+            if image_path in self.cache:
+                continue
+            try:
+                self.cache.put(image_path, decode_for_display(image_path, self.max_width, self.max_height))
+            except Exception as e:
+                print(f"Error prefetching {image_path}: {e}")
+
+class ProposalCache:
+    """
+    Detector box proposals per image, computed by background workers.
+
+    Requests are queued with a priority so the next few images ahead of the
+    cursor are served before the rest of the class. Results are kept in
+    memory and saved to a JSON file keyed by path and modification time, so
+    reopening the labeller does not rerun the model.
+    """
+
+    def __init__(self, backend, cache_path, workers=2):
+        self.backend = backend
+        self.cache_path = Path(cache_path)
+        self.lock = threading.Lock()
+        self.queue = queue.PriorityQueue()
+        self.counter = itertools.count()
+        self.pending = set()
+        self.proposals = {}
+
+        if self.cache_path.exists():
+            try:
+                with open(self.cache_path, 'r') as f:
+                    self.proposals = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable proposal cache: {e}")
+
+        for _ in range(workers):
+            threading.Thread(target=self._worker, daemon=True).start()
+
+    def get(self, image_path):
+        """Proposals as [class_id, conf, x1, y1, x2, y2] rows, or None if not ready"""
+        with self.lock:
+            entry = self.proposals.get(image_path)
+        if entry and entry['mtime'] == os.path.getmtime(image_path):
+            return entry['boxes']
+        return None
+
+    def request(self, image_paths, urgent=False):
+        priority = 0 if urgent else 1
+        for image_path in image_paths:
+            with self.lock:
+                if image_path in self.pending and not urgent:
+                    continue
+                self.pending.add(image_path)
+            if self.get(image_path) is None:
+                self.queue.put((priority, next(self.counter), image_path))
+
+    def _worker(self):
+        while True:
+            _, _, image_path = self.queue.get()
+            # An urgent request can queue a path that a batch request already finished
+            if self.get(image_path) is not None:
+                continue
+            try:
+                image = cv2.imread(image_path)
+                if image is None:
+                    raise IOError("could not read image")
+                predictions = self.backend.predict(image)
+                boxes = [[int(cls), float(conf), float(x1), float(y1), float(x2), float(y2)]
+                         for x1, y1, x2, y2, conf, cls in predictions]
+                with self.lock:
+                    self.proposals[image_path] = {'mtime': os.path.getmtime(image_path), 'boxes': boxes}
+            except Exception as e:
+                print(f"Error proposing boxes for {image_path}: {e}")
+
+    def save(self):
+        with self.lock:
+            data = dict(self.proposals)
+        with open(self.cache_path, 'w') as f:
+            json.dump(data, f)
 
 class ImageLabeler:
-    def __init__(self, dataset_path):
+    def __init__(self, dataset_path, weights_path=None, prefetch=5):
         self.dataset_path = dataset_path
         self.classes = self._get_classes()
         if not self.classes:
@@ -20,8 +179,8 @@ class ImageLabeler:
         # Initialize variables
         self.current_class_index = 0
         self.current_image_index = 0
-        self.images = {}  # Dictionary to store images for each class
-        self.current_image = None
+        self.images = {}  # Class name -> list of source images, each with its augmented variants
+        self.current_image_shape = None  # (height, width) of the file on disk
         self.photo = None
         self.drawing = False
         self.start_x = None
@@ -29,17 +188,38 @@ class ImageLabeler:
         self.current_rect = None
         self.image_width = 800
         self.image_height = 600
+        # Label and image files are written off the Tk thread
+        self.writer = ThreadPoolExecutor(max_workers=1)
+        self.prefetch = prefetch
+        self.image_cache = DecodedImageCache()
+        self.image_prefetcher = ImagePrefetcher(self.image_cache, self.image_width, self.image_height)
+        self.boxes = []  # Boxes on the current image: class id, canvas coords, canvas items
         
         # Create YOLO dataset directory
         self.timestamp = time.strftime("%Y%m%d_%H%M%S")
         self.yolo_path = Path(f'yolo_dataset_{self.timestamp}')
         self.setup_directories()
         self.save_class_info()
+        self.index = AnnotationIndex(self.yolo_path / 'annotations.sqlite')
         
         # Load all images
         self._load_all_class_images()
+        self.proposal_cache = self._create_proposal_cache(weights_path)
         self.setup_gui()
 
+    def _create_proposal_cache(self, weights_path):
+        """Pre-labelling with the trained detector, if weights are available"""
+        if not weights_path:
+            return None
+        try:
+            from inference_backends import load_backend
+            backend = load_backend('auto', weights_path, conf_threshold=0.25)
+        except Exception as e:
+            print(f"Pre-labelling disabled, could not load detector: {e}")
+            return None
+        print(f"Pre-labelling with {backend.name} backend")
+        return ProposalCache(backend, os.path.join(self.dataset_path, 'proposals.json'))
+
     def _get_classes(self):
         return [folder for folder in sorted(os.listdir(self.dataset_path)) 
                 if os.path.isdir(os.path.join(self.dataset_path, folder))]
@@ -48,11 +228,11 @@ class ImageLabeler:
         self.images = {}
         for class_name in self.classes:
             class_path = os.path.join(self.dataset_path, class_name)
-            self.images[class_name] = [
+            self.images[class_name] = group_variants(
                 os.path.join(class_path, f) for f in os.listdir(class_path)
                 if f.lower().endswith(('.png', '.jpg', '.jpeg'))
-            ]
-        print("Loaded images for classes:", {k: len(v) for k, v in self.images.items()})
+            )
+        print("Loaded source images for classes:", {k: len(v) for k, v in self.images.items()})
 
     def setup_directories(self):
         (self.yolo_path / 'train' / 'images').mkdir(parents=True, exist_ok=True)
@@ -61,9 +241,11 @@ class ImageLabeler:
 
     def save_class_info(self):
         data_yaml = self.yolo_path / 'data.yaml'
+        # Relative paths; the val split is written to split/ by dataset_builder.py
         data_dict = {
-            'train': str(self.yolo_path / 'train' / 'images'),
-            'val': str(self.yolo_path / 'train' / 'images'),  # Using same for validation
+            'path': '.',
+            'train': 'train/images',
+            'val': 'split/val/images',
             'nc': len(self.classes),
             'names': self.classes
         }
@@ -108,15 +290,30 @@ class ImageLabeler:
         tk.Button(self.control_panel, text="Previous Image (←)", command=self.prev_image).pack(pady=2)
         tk.Button(self.control_panel, text="Next Image (→)", command=self.next_image).pack(pady=2)
         tk.Button(self.control_panel, text="Save (S)", command=self.save_annotation).pack(pady=2)
-        tk.Button(self.control_panel, text="Clear Box (C)", command=self.clear_box).pack(pady=2)
+        tk.Button(self.control_panel, text="Undo Box (Z)", command=self.undo_box).pack(pady=2)
+        tk.Button(self.control_panel, text="Clear Boxes (C)", command=self.clear_box).pack(pady=2)
+
+        # Class for the next box drawn
+        tk.Label(self.control_panel, text="Box class (1-9):").pack(pady=(10, 0))
+        self.class_listbox = tk.Listbox(self.control_panel, height=min(len(self.classes), 8), exportselection=False)
+        for i, class_name in enumerate(self.classes):
+            self.class_listbox.insert(tk.END, f"{i + 1}. {class_name}")
+        self.class_listbox.pack(pady=2)
+        self.class_listbox.bind('<<ListboxSelect>>', lambda e: self.select_class(self.class_listbox.curselection()[0]))
+        self.selected_class = 0
         
         # Add instructions label
         instructions = """
         Instructions:
-        1. Draw box around object
-        2. Press 'S' to save
+        1. Pick a class, draw a box
+           around each object
+        2. Press 'S' to save (labels
+           every augmented variant)
         3. Use arrows to navigate
-        4. Press 'C' to clear box
+        4. Right-click removes a box,
+           'Z' the last one, 'C' all
+        5. Proposed boxes are pre-drawn;
+           remove wrong ones and save
         """
         tk.Label(self.control_panel, text=instructions, justify=tk.LEFT, wraplength=180).pack(pady=10)
         
@@ -128,6 +325,10 @@ class ImageLabeler:
         self.root.bind('<Right>', lambda e: self.next_image())
         self.root.bind('s', lambda e: self.save_annotation())
         self.root.bind('c', lambda e: self.clear_box())
+        self.root.bind('z', lambda e: self.undo_box())
+        self.canvas.bind("<ButtonPress-3>", self.remove_box_at)
+        for i in range(min(len(self.classes), 9)):
+            self.root.bind(str(i + 1), lambda e, class_id=i: self.select_class(class_id))
         
         # Load initial image
         self.update_display()
@@ -135,25 +336,88 @@ class ImageLabeler:
     def update_display(self):
         current_class = self.classes[self.current_class_index]
         self.class_label.config(text=f"Class: {current_class}")
+        self.select_class(self.current_class_index)
         
         if current_class in self.images and self.images[current_class]:
-            self.load_image(self.images[current_class][self.current_image_index])
-            total_images = len(self.images[current_class])
-            self.counter_label.config(text=f"Image: {self.current_image_index + 1}/{total_images}")
+            self.load_current_group()
+            # Run the detector over the rest of the class in the background
+            if self.proposal_cache:
+                self.proposal_cache.request(self.group_paths(self.images[current_class]))
         else:
             self.canvas.delete("all")
             messagebox.showwarning("Warning", f"No images found in class: {current_class}")
 
+    def current_group(self):
+        current_class = self.classes[self.current_class_index]
+        return self.images[current_class][self.current_image_index]
+
+    def group_paths(self, groups):
+        return [group['variants'][display_variant(group['variants'])] for group in groups]
+
+    def load_current_group(self):
+        group = self.current_group()
+        self.display_aug = display_variant(group['variants'])
+        image_path = group['variants'][self.display_aug]
+        self.load_image(image_path)
+        groups = self.images[self.classes[self.current_class_index]]
+        self.counter_label.config(
+            text=f"Image: {self.current_image_index + 1}/{len(groups)} ({len(group['variants'])} variants)"
+        )
+
+        self.prefetch_around_cursor(groups)
+
+        if self.proposal_cache:
+            # Current image first, then the next few ahead of the cursor
+            upcoming = groups[self.current_image_index:self.current_image_index + self.prefetch + 1]
+            self.proposal_cache.request(self.group_paths(upcoming), urgent=True)
+            self.show_proposals(image_path)
+
+    def prefetch_around_cursor(self, groups):
+        """Decode the next and previous images, nearest first"""
+        nearby = []
+        for distance in range(1, self.prefetch + 1):
+            for index in (self.current_image_index + distance, self.current_image_index - distance):
+                if 0 <= index < len(groups):
+                    nearby.append(groups[index])
+        self.image_prefetcher.schedule(self.group_paths(nearby))
+
+    def show_proposals(self, image_path):
+        """Pre-draw cached proposals as boxes, or poll until the workers have them"""
+        current = self.current_group()['variants'][self.display_aug]
+        if image_path != current or self.drawing or self.boxes:
+            return
+
+        proposals = self.proposal_cache.get(image_path)
+        if proposals is None:
+            self.root.after(100, self.show_proposals, image_path)
+            return
+
+        for class_id, conf, *xyxy in proposals:
+            if class_id < len(self.classes):
+                self.add_box(class_id, self.image_to_canvas(xyxy), note=f"{conf:.2f}")
+
+    def image_to_canvas(self, xyxy):
+        """Original image pixel coordinates to canvas coordinates"""
+        img_height, img_width = self.current_image_shape
+        display_height, display_width = self.display_image.shape[:2]
+        offset_x = (self.image_width - display_width) // 2
+        offset_y = (self.image_height - display_height) // 2
+        x1, y1, x2, y2 = xyxy
+        return (
+            int(x1 * display_width / img_width) + offset_x,
+            int(y1 * display_height / img_height) + offset_y,
+            int(x2 * display_width / img_width) + offset_x,
+            int(y2 * display_height / img_height) + offset_y
+        )
+
     def load_image(self, image_path):
-        self.current_image = cv2.imread(image_path)
-        self.current_image = cv2.cvtColor(self.current_image, cv2.COLOR_BGR2RGB)
-        
-        # Resize for display
-        height, width = self.current_image.shape[:2]
-        scaling = min(self.image_width/width, self.image_height/height)
-        new_width, new_height = int(width*scaling), int(height*scaling)
-        
-        self.display_image = cv2.resize(self.current_image, (new_width, new_height))
+        # Usually already decoded by the prefetcher
+        cached = self.image_cache.get(image_path)
+        if cached is None:
+            cached = decode_for_display(image_path, self.image_width, self.image_height)
+            self.image_cache.put(image_path, cached)
+        self.current_image_shape, self.display_image = cached
+        new_height, new_width = self.display_image.shape[:2]
         
         # Convert to PhotoImage
         image = Image.fromarray(self.display_image)
@@ -187,22 +451,26 @@ class ImageLabeler:
         if current_class in self.images:
             if self.current_image_index < len(self.images[current_class]) - 1:
                 self.current_image_index += 1
-                self.load_image(self.images[current_class][self.current_image_index])
                 self.clear_box()
+                self.load_current_group()
 
     def prev_image(self):
         current_class = self.classes[self.current_class_index]
         if current_class in self.images:
             if self.current_image_index > 0:
                 self.current_image_index -= 1
-                self.load_image(self.images[current_class][self.current_image_index])
                 self.clear_box()
+                self.load_current_group()
+
+    def select_class(self, class_id):
+        self.selected_class = class_id
+        self.class_listbox.selection_clear(0, tk.END)
+        self.class_listbox.selection_set(class_id)
 
     def start_drawing(self, event):
         self.drawing = True
         self.start_x = event.x
         self.start_y = event.y
-        self.clear_box()
 
     def draw_rectangle(self, event):
         if not self.drawing:
@@ -214,38 +482,67 @@ class ImageLabeler:
         self.current_rect = self.canvas.create_rectangle(
             self.start_x, self.start_y,
             event.x, event.y,
-            outline="red",
+            outline=BOX_COLORS[self.selected_class % len(BOX_COLORS)],
             width=2
         )
 
     def stop_drawing(self, event):
         if self.drawing:
             self.drawing = False
-            self.roi_points = [(self.start_x, self.start_y), (event.x, event.y)]
+            if self.current_rect:
+                self.canvas.delete(self.current_rect)
+                self.current_rect = None
+            # Ignore clicks that did not drag out a box
+            if abs(event.x - self.start_x) > 3 and abs(event.y - self.start_y) > 3:
+                self.add_box(self.selected_class, (self.start_x, self.start_y, event.x, event.y))
+
+    def add_box(self, class_id, coords, note=""):
+        x1, y1, x2, y2 = coords
+        coords = (min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
+        color = BOX_COLORS[class_id % len(BOX_COLORS)]
+        items = [
+            self.canvas.create_rectangle(*coords, outline=color, width=2),
+            self.canvas.create_text(
+                coords[0] + 2, coords[1] - 8, anchor="w", fill=color,
+                text=f"{self.classes[class_id]} {note}".strip()
+            )
+        ]
+        self.boxes.append({'class_id': class_id, 'coords': coords, 'items': items})
+
+    def remove_box(self, box):
+        for item in box['items']:
+            self.canvas.delete(item)
+        self.boxes.remove(box)
+
+    def remove_box_at(self, event):
+        # Topmost (latest) box under the cursor
+        for box in reversed(self.boxes):
+            x1, y1, x2, y2 = box['coords']
+            if x1 <= event.x <= x2 and y1 <= event.y <= y2:
+                self.remove_box(box)
+                return
+
+    def undo_box(self):
+        if self.boxes:
+            self.remove_box(self.boxes[-1])
 
     def clear_box(self):
-        if hasattr(self, 'current_rect') and self.current_rect:
+        if self.current_rect:
             self.canvas.delete(self.current_rect)
         self.current_rect = None
-        if hasattr(self, 'roi_points'):
-            del self.roi_points
+        for box in list(self.boxes):
+            self.remove_box(box)
 
-    def save_annotation(self):
-        if not hasattr(self, 'roi_points'):
-            messagebox.showwarning("Warning", "Please draw a bounding box first!")
-            return
-            
+    def canvas_to_yolo(self, coords):
+        """Canvas rectangle to normalized YOLO (x_center, y_center, width, height)"""
         # Get dimensions
-        img_height, img_width = self.current_image.shape[:2]
+        img_height, img_width = self.current_image_shape
         display_height, display_width = self.display_image.shape[:2]
         
-        # Get coordinates
-        x1, y1 = self.roi_points[0]
-        x2, y2 = self.roi_points[1]
-        
         # Adjust for image position in canvas
         canvas_x = (self.image_width - display_width) // 2
         canvas_y = (self.image_height - display_height) // 2
+        x1, y1, x2, y2 = coords
         x1 = x1 - canvas_x
         x2 = x2 - canvas_x
         y1 = y1 - canvas_y
@@ -268,34 +565,65 @@ class ImageLabeler:
         y_center = max(0, min(1, y_center))
         width = max(0, min(1, width))
         height = max(0, min(1, height))
-        
-        current_class = self.classes[self.current_class_index]
-        current_image_path = self.images[current_class][self.current_image_index]
-        
-        # Save files
-        image_name = os.path.basename(current_image_path)
-        base_name = os.path.splitext(image_name)[0]
-        
-        # Save label
-        label_path = self.yolo_path / 'train' / 'labels' / f"{base_name}.txt"
-        with open(label_path, 'w') as f:
-            class_id = self.current_class_index
-            f.write(f"{class_id} {x_center:.6f} {y_center:.6f} {width:.6f} {height:.6f}\n")
-        
-        # Copy image
-        shutil.copy(
-            current_image_path,
-            self.yolo_path / 'train' / 'images' / image_name
+        return x_center, y_center, width, height
+
+    def save_annotation(self):
+        if not self.boxes:
+            messagebox.showwarning("Warning", "Please draw a bounding box first!")
+            return
+
+        img_height, img_width = self.current_image_shape
+        labels = np.array(
+            [[box['class_id'], *self.canvas_to_yolo(box['coords'])] for box in self.boxes],
+            dtype=np.float32
+        )
+
+        # One annotation covers every variant of the source image
+        self.writer.submit(
+            self.write_group_labels,
+            self.current_group(), self.display_aug, labels, img_width, img_height
         )
         
         # Move to next image
         self.next_image()
 
+    def write_group_labels(self, group, annotated_aug, labels, img_width, img_height):
+        """Write YOLO labels and link images for all variants of one source image"""
+        try:
+            annotated_angle = variant_angle(annotated_aug)
+            index_entries = []
+            for aug_name, image_path in group['variants'].items():
+                # Noise/brightness/blur variants are pixel-aligned; rotations move the box
+                delta = (variant_angle(aug_name) - annotated_angle) % 360
+                variant_labels = rotate_boxes(labels, delta, img_width, img_height) if delta else labels
+
+                image_name = os.path.basename(image_path)
+                base_name = os.path.splitext(image_name)[0]
+                label_path = self.yolo_path / 'train' / 'labels' / f"{base_name}.txt"
+                with open(label_path, 'w') as f:
+                    for class_id, x_center, y_center, width, height in variant_labels:
+                        f.write(f"{int(class_id)} {x_center:.6f} {y_center:.6f} {width:.6f} {height:.6f}\n")
+
+                link_file(image_path, self.yolo_path / 'train' / 'images' / image_name)
+                index_entries.append((
+                    f"train/images/{image_name}", group['source'], aug_name, img_width, img_height, variant_labels
+                ))
+
+            self.index.replace_images(index_entries)
+        except Exception as e:
+            print(f"Error saving labels for {group['source']}: {e}")
+
     def run(self):
         self.root.mainloop()
+        self.writer.shutdown(wait=True)
+        self.index.close()
+        if self.proposal_cache:
+            self.proposal_cache.save()
 
 if __name__ == "__main__":
     # Use raw string (r) prefix for Windows paths
     dataset_path = r"C:\Users\Suman_PC\Documents\GitHub\smart_checkout_system\augmented_datasets"
-    labeler = ImageLabeler(dataset_path)
+    # Trained detector used to propose boxes; labelling works without it
+    weights_path = "runs/train/exp/weights/best.pt"
+    labeler = ImageLabeler(dataset_path, weights_path if os.path.exists(weights_path) else None)
     labeler.run()
\ No newline at end of file
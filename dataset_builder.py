@@ -0,0 +1,124 @@
+import os
+import sys
+import shutil
+import random
+from collections import Counter
+from pathlib import Path
+
+import yaml
+
+from annotation_index import AnnotationIndex, rebuild_index
+
+def link_file(src, dst, mode='hard'):
+    """Hard link or relative symlink src to dst, copying only when linking is not possible"""
+    if os.path.lexists(dst):
+        os.remove(dst)
+    try:
+        if mode == 'symlink':
+            os.symlink(os.path.relpath(src, os.path.dirname(dst)), dst)
+        else:
+            os.link(src, dst)
+    except OSError:
+        shutil.copy(src, dst)
+
+def stratified_split(source_classes, val_fraction=0.2, seed=0):
+    """
+    Split source photos into (train, val) sets.
+    Each source is stratified by its rarest class, so every class gets its
+    share of validation photos; all augmented variants follow their source.
+    """
+    class_frequency = Counter(c for classes in source_classes.values() for c in classes)
+    strata = {}
+    for source, classes in sorted(source_classes.items()):
+        key = min(classes, key=lambda c: (class_frequency[c], c)) if classes else None
+        strata.setdefault(key, []).append(source)
+
+    rng = random.Random(seed)
+    train, val = set(), set()
+    for key, sources in sorted(strata.items(), key=lambda item: str(item[0])):
+        rng.shuffle(sources)
+        # Keep at least one photo per class on each side when there are two or more
+        num_val = int(round(len(sources) * val_fraction))
+        if len(sources) > 1:
+            num_val = min(max(num_val, 1), len(sources) - 1)
+        val.update(sources[:num_val])
+        train.update(sources[num_val:])
+    return train, val
+
+def write_dataset_config(config_path, dataset_dir, class_names):
+    """data.yaml with paths relative to the config file, so it works on any machine"""
+    config_dir = Path(config_path).resolve().parent
+    config = {
+        'path': Path(os.path.relpath(Path(dataset_dir).resolve(), config_dir)).as_posix(),
+        'train': 'train/images',
+        'val': 'val/images',
+        'nc': len(class_names),
+        'names': list(class_names)
+    }
+    with open(config_path, 'w') as f:
+        yaml.dump(config, f, sort_keys=False)
+    return config_path
+
+def load_dataset_config(config_path):
+    """Read a dataset config, resolving train/val against its 'path' and the file's own directory"""
+    with open(config_path, 'r') as f:
+        config = yaml.safe_load(f)
+    root = Path(config_path).resolve().parent / config.get('path', '.')
+    for split in ('train', 'val'):
+        if split in config:
+            config[split] = str((root / config[split]).resolve())
+    return config
+
+def build_dataset(dataset_dir, output_dir=None, val_fraction=0.2, seed=0, link_mode='hard',
+                  config_path='dataset_config.yaml'):
+    """
+    Write a train/val split of a labelled dataset as links into output_dir
+    (default <dataset_dir>/split) and point config_path at it.
+    Returns (config_path, output_dir).
+    """
+    dataset_dir = Path(dataset_dir)
+    output_dir = Path(output_dir) if output_dir else dataset_dir / 'split'
+
+    with open(dataset_dir / 'data.yaml', 'r') as f:
+        class_names = yaml.safe_load(f)['names']
+
+    db_path = dataset_dir / 'annotations.sqlite'
+    index = AnnotationIndex(db_path) if db_path.exists() else rebuild_index(dataset_dir)
+    try:
+        source_classes = index.source_classes()
+        train_sources, val_sources = stratified_split(source_classes, val_fraction, seed)
+        splits = {
+            'train': index.images_for_sources(train_sources),
+            'val': index.images_for_sources(val_sources)
+        }
+    finally:
+        index.close()
+
+    for split, image_paths in splits.items():
+        # Start clean so photos that moved split do not linger
+        shutil.rmtree(output_dir / split, ignore_errors=True)
+        (output_dir / split / 'images').mkdir(parents=True)
+        (output_dir / split / 'labels').mkdir(parents=True)
+
+        for image_path in image_paths:
+            image_path = dataset_dir / image_path
+            label_path = image_path.parent.parent / 'labels' / (image_path.stem + '.txt')
+            link_file(image_path, output_dir / split / 'images' / image_path.name, link_mode)
+            if label_path.exists():
+                link_file(label_path, output_dir / split / 'labels' / label_path.name, link_mode)
+
+    write_dataset_config(output_dir / 'data.yaml', output_dir, class_names)
+    write_dataset_config(config_path, output_dir, class_names)
+
+    # Class balance of each split, counted by source photo
+    for split, sources in (('train', train_sources), ('val', val_sources)):
+        counts = Counter(c for source in sources for c in source_classes[source])
+        per_class = ", ".join(f"{name}: {counts[i]}" for i, name in enumerate(class_names))
+        print(f"{split}: {len(splits[split])} images from {len(sources)} photos ({per_class})")
+
+    return config_path, output_dir
+
+if __name__ == "__main__":
+    dataset_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join("model_files", "yolo_dataset_20241105_134756")
+    config_path, output_dir = build_dataset(dataset_dir)
+    print(f"Split written to {output_dir}, config saved to {config_path}")
@@ -0,0 +1,130 @@
+import math
+
+import cv2
+import numpy as np
+from PIL import Image
+
+DISPLAY_SIZE = (420, 310)  # Camera label size in the checkout window
+
+def draw_detections_into(img, detections, scale=(1.0, 1.0), font_scale=0.5, thickness=2):
+    """Draw detection boxes and labels on img in place, scaling frame coordinates by (sx, sy)"""
+    sx, sy = scale
+    color = (0, 255, 0, 255)[:img.shape[2]]
+    for det in detections:
+        x1, y1, x2, y2 = det['bbox']
+        x1, x2 = int(x1 * sx), int(x2 * sx)
+        y1, y2 = int(y1 * sy), int(y2 * sy)
+        cv2.rectangle(img, (x1, y1), (x2, y2), color, thickness)
+        label = f"{det['class']} {det['confidence']:.2f}"
+        if 'track_id' in det:
+            label = f"#{det['track_id']} {label}"
+        cv2.putText(img, label, (x1, y1 - 10),
+                   cv2.FONT_HERSHEY_SIMPLEX, font_scale, color, thickness)
+    return img
+
+def draw_detections(frame, detections):
+    """Copy of the frame with detection boxes and labels drawn on it"""
+    return draw_detections_into(frame.copy(), detections)
+
+def grid_shape(num_views):
+    """(rows, cols) of the near-square grid used to show several cameras"""
+    cols = math.ceil(math.sqrt(num_views))
+    return math.ceil(num_views / cols), cols
+
+def preview_size(num_views, size=DISPLAY_SIZE):
+    """Size of one camera's cell in the display, rounded down to even for YUV420 streams"""
+    rows, cols = grid_shape(num_views)
+    return (size[0] // cols) & ~1, (size[1] // rows) & ~1
+
+def tile_frames(frames):
+    """Lay out same-sized camera frames in a near-square grid (one frame passes through)"""
+    if len(frames) == 1:
+        return frames[0]
+    rows, cols = grid_shape(len(frames))
+    height, width = frames[0].shape[:2]
+    grid = np.zeros((rows * height, cols * width, 3), dtype=frames[0].dtype)
+    for i, frame in enumerate(frames):
+        row, col = divmod(i, cols)
+        grid[row * height:(row + 1) * height, col * width:(col + 1) * width] = frame
+    return grid
+
+def resize_for_display(frame, size=DISPLAY_SIZE):
+    """PIL image of the frame scaled to the camera label"""
+    img = Image.fromarray(frame)
+    return img.resize(size, Image.Resampling.LANCZOS)
+
+class DisplayRenderer:
+    """
+    Draws camera frames and overlays into buffers allocated once.
+
+    Each view is scaled (or, for a lores preview already at cell size,
+    converted) into a preallocated RGB scratch image, the overlay is drawn
+    on it in place and it is copied into its cell of one RGBA display
+    buffer. Colour conversion happens only in to_cell(). A PIL
+    image shares that buffer's memory and one persistent PhotoImage is
+    refreshed from it with paste(), so steady-state frames allocate nothing.
+    """
+
+    def __init__(self, num_views=1, size=DISPLAY_SIZE):
+        self.size = size
+        rows, cols = grid_shape(num_views)
+        cell_w, cell_h = preview_size(num_views, size)
+
+        self.buffer = np.zeros((size[1], size[0], 4), dtype=np.uint8)
+        self.buffer[..., 3] = 255
+        self.cells = []
+        for i in range(num_views):
+            row, col = divmod(i, cols)
+            self.cells.append(self.buffer[row * cell_h:(row + 1) * cell_h, col * cell_w:(col + 1) * cell_w, :3])
+        self.scratch = [np.empty((cell_h, cell_w, 3), dtype=np.uint8) for _ in range(num_views)]
+
+        # RGBA is one of the modes PIL can wrap without copying
+        self.image = Image.frombuffer('RGBA', size, self.buffer, 'raw', 'RGBA', 0, 1)
+        self.photo = None
+
+    def photo_image(self):
+        """The PhotoImage to show; create it once the Tk root exists"""
+        if self.photo is None:
+            from PIL import ImageTk
+            self.photo = ImageTk.PhotoImage(self.image)
+        return self.photo
+
+    def to_cell(self, source, scratch):
+        """
+        Scale or convert one camera image into its scratch buffer as RGB.
+        Main-stream frames are BGR (OpenCV order, and Picamera2's RGB888); lores previews are YUV420.
+        """
+        height, width = scratch.shape[:2]
+        if source.ndim == 2:
+            # YUV420 lores stream from Picamera2
+            if source.shape == (height * 3 // 2, width):
+                cv2.cvtColor(source, cv2.COLOR_YUV2RGB_I420, dst=scratch)
+            else:
+                # Padded row stride (or another size): convert, then crop or scale
+                rgb = cv2.cvtColor(source, cv2.COLOR_YUV2RGB_I420)
+                if rgb.shape[0] == height and rgb.shape[1] >= width:
+                    np.copyto(scratch, rgb[:, :width])
+                else:
+                    cv2.resize(rgb, (width, height), dst=scratch, interpolation=cv2.INTER_AREA)
+        elif source.shape[:2] == (height, width):
+            cv2.cvtColor(source[..., :3], cv2.COLOR_BGR2RGB, dst=scratch)
+        else:
+            cv2.resize(source[..., :3], (width, height), dst=scratch, interpolation=cv2.INTER_AREA)
+            cv2.cvtColor(scratch, cv2.COLOR_BGR2RGB, dst=scratch)
+
+    def render(self, frames, detections_per_view, previews=None):
+        """Update the display buffer (and the PhotoImage, if created) for one set of camera frames"""
+        for i, (frame, cell, scratch) in enumerate(zip(frames, self.cells, self.scratch)):
+            source = previews[i] if previews is not None and previews[i] is not None else frame
+            self.to_cell(source, scratch)
+
+            detections = detections_per_view[i] if i < len(detections_per_view) else []
+            if detections:
+                # Boxes are in main-stream coordinates
+                scale = (scratch.shape[1] / frame.shape[1], scratch.shape[0] / frame.shape[0])
+                draw_detections_into(scratch, detections, scale, font_scale=0.4, thickness=1)
+            np.copyto(cell, scratch)
+
+        if self.photo is not None:
+            self.photo.paste(self.image)
+        return self.image
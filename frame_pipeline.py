@@ -0,0 +1,190 @@
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+class LatestFrameQueue:
+    """Bounded queue where new items push out the oldest unread ones"""
+
+    def __init__(self, maxsize=1):
+        self._items = deque(maxlen=maxsize)
+        self._cond = threading.Condition()
+        self.dropped = 0
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Return the oldest item, or None if nothing arrives before timeout"""
+        with self._cond:
+            if not self._items and timeout != 0:
+                self._cond.wait(timeout)
+            if not self._items:
+                return None
+            return self._items.popleft()
+
+
+class FPSCounter:
+    """Rate of tick() calls over a sliding window"""
+
+    def __init__(self, window=30):
+        self._times = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def tick(self):
+        with self._lock:
+            self._times.append(time.perf_counter())
+
+    @property
+    def fps(self):
+        with self._lock:
+            if len(self._times) < 2:
+                return 0.0
+            elapsed = self._times[-1] - self._times[0]
+            if elapsed <= 0:
+                return 0.0
+            return (len(self._times) - 1) / elapsed
+
+
+class InferenceScheduler:
+    """
+    Decides per frame whether the detector needs to run.
+
+    Detection runs when a downsampled copy of the frame differs enough from
+    the one last sent to the model, or when `max_interval` frames have gone
+    by without a run so slow changes are still picked up.
+    """
+
+    def __init__(self, max_interval=15, motion_threshold=6.0, downsample=8):
+        self.max_interval = max_interval
+        self.motion_threshold = motion_threshold  # Mean absolute difference, 0-255 scale
+        self.downsample = downsample
+
+        self._reference = None
+        self._frames_since_run = 0
+        self.runs = 0
+        self.skips = 0
+
+    def motion_score(self, frame):
+        """Mean absolute difference against the last inferred frame (inf if none)"""
+        # Works on one HxWx3 frame or a (cameras, H, W, 3) batch
+        small = frame[..., ::self.downsample, ::self.downsample, :].astype(np.int16)
+        if self._reference is None or self._reference.shape != small.shape:
+            return float('inf'), small
+        return float(np.abs(small - self._reference).mean()), small
+
+    def should_run(self, frame):
+        score, small = self.motion_score(frame)
+        self._frames_since_run += 1
+
+        if score >= self.motion_threshold or self._frames_since_run >= self.max_interval:
+            self._reference = small
+            self._frames_since_run = 0
+            self.runs += 1
+            return True
+
+        self.skips += 1
+        return False
+
+    def reset(self):
+        """Force detection on the next frame"""
+        self._reference = None
+
+    @property
+    def skip_ratio(self):
+        total = self.runs + self.skips
+        return self.skips / total if total else 0.0
+
+
+class FramePipeline:
+    """
+    Capture thread and inference worker linked by latest-frame-wins queues.
+
+    The capture thread pushes every frame to both the display and inference
+    queues. The inference worker always picks up the newest frame, so a slow
+    model never holds back the preview; the UI reads `detections` and overlays
+    whatever the worker produced last. With a scheduler, frames it rejects
+    keep the previous detections instead of running the model.
+    """
+
+    def __init__(self, capture_fn, detect_fn, scheduler=None):
+        self.capture_fn = capture_fn
+        self.detect_fn = detect_fn
+        self.scheduler = scheduler
+
+        self.display_queue = LatestFrameQueue()
+        self.inference_queue = LatestFrameQueue()
+        self.fps = {
+            'capture': FPSCounter(),
+            'inference': FPSCounter(),
+            'display': FPSCounter()
+        }
+
+        self._detections = []
+        self._detections_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._threads = []
+
+    def start(self):
+        self._stop_event.clear()
+        self._threads = [
+            threading.Thread(target=self._capture_loop, name="capture", daemon=True),
+            threading.Thread(target=self._inference_loop, name="inference", daemon=True)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout=2.0):
+        self._stop_event.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    @property
+    def detections(self):
+        with self._detections_lock:
+            return self._detections
+
+    def get_display_frame(self):
+        """Latest captured frame for the UI, or None if there is no new one"""
+        frame = self.display_queue.get(timeout=0)
+        if frame is not None:
+            self.fps['display'].tick()
+        return frame
+
+    def stats(self):
+        return {stage: counter.fps for stage, counter in self.fps.items()}
+
+    def _capture_loop(self):
+        while not self._stop_event.is_set():
+            try:
+                frame = self.capture_fn()
+            except Exception as e:
+                print(f"Error capturing frame: {e}")
+                self._stop_event.wait(1.0)
+                continue
+
+            self.fps['capture'].tick()
+            self.display_queue.put(frame)
+            self.inference_queue.put(frame)
+
+    def _inference_loop(self):
+        while not self._stop_event.is_set():
+            frame = self.inference_queue.get(timeout=0.5)
+            if frame is None:
+                continue
+
+            # Reuse the last detections while the scene is unchanged
+            if self.scheduler is not None and not self.scheduler.should_run(frame):
+                continue
+
+            detections = self.detect_fn(frame)
+            with self._detections_lock:
+                self._detections = detections
+            self.fps['inference'].tick()
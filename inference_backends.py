@@ -0,0 +1,304 @@
+import math
+import os
+
+import cv2
+import numpy as np
+
+STRIDE = 32  # Largest YOLOv5 stride; dynamic-shape inputs must be a multiple of it
+
+
+def letterbox(image, new_shape=640, color=(114, 114, 114), scaleup=True):
+    """
+    Resize keeping aspect ratio and pad to new_shape, as YOLOv5 does.
+    With scaleup=False smaller images are only padded, never enlarged.
+    Returns the padded image, the scale ratio and the (left, top) padding.
+    """
+    if isinstance(new_shape, int):
+        new_shape = (new_shape, new_shape)  # (height, width)
+
+    height, width = image.shape[:2]
+    ratio = min(new_shape[0] / height, new_shape[1] / width)
+    if not scaleup:
+        ratio = min(ratio, 1.0)
+    new_width, new_height = int(round(width * ratio)), int(round(height * ratio))
+
+    if (new_width, new_height) != (width, height):
+        image = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+
+    pad_w = (new_shape[1] - new_width) / 2
+    pad_h = (new_shape[0] - new_height) / 2
+    top, bottom = int(round(pad_h - 0.1)), int(round(pad_h + 0.1))
+    left, right = int(round(pad_w - 0.1)), int(round(pad_w + 0.1))
+    image = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)
+    return image, ratio, (left, top)
+
+
+def stride_shape(height, width, max_size=640, stride=STRIDE):
+    """
+    Smallest model input (height, width) for an image: scaled down so the
+    longer side fits max_size but never up, then rounded up to the stride
+    """
+    ratio = min(1.0, max_size / max(height, width))
+    return (
+        math.ceil(height * ratio / stride) * stride,
+        math.ceil(width * ratio / stride) * stride
+    )
+
+
+def scale_boxes(boxes, ratio, pad, original_shape):
+    """Map [x1, y1, x2, y2] boxes from letterboxed input back to the original image"""
+    boxes = boxes.copy()
+    boxes[:, [0, 2]] = (boxes[:, [0, 2]] - pad[0]) / ratio
+    boxes[:, [1, 3]] = (boxes[:, [1, 3]] - pad[1]) / ratio
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, original_shape[1])
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, original_shape[0])
+    return boxes
+
+
+def xywh2xyxy(boxes):
+    converted = np.empty_like(boxes)
+    converted[:, :2] = boxes[:, :2] - boxes[:, 2:4] / 2
+    converted[:, 2:4] = boxes[:, :2] + boxes[:, 2:4] / 2
+    return converted
+
+
+def nms(boxes, scores, iou_threshold):
+    """Indices of boxes kept by greedy NMS, highest score first"""
+    x1, y1, x2, y2 = boxes.T
+    areas = (x2 - x1) * (y2 - y1)
+    order = scores.argsort()[::-1]
+
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+
+        # IoU of the kept box against every remaining box at once
+        w = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        h = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        inter = w * h
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+
+def non_max_suppression(prediction, conf_threshold=0.25, iou_threshold=0.45, max_det=300):
+    """
+    Filter raw YOLOv5 output for one image, shape (N, 5 + num_classes).
+    Returns (M, 6) rows of [x1, y1, x2, y2, confidence, class_id].
+    """
+    prediction = prediction[prediction[:, 4] > conf_threshold]
+    if not len(prediction):
+        return np.zeros((0, 6), dtype=np.float32)
+
+    scores = prediction[:, 5:] * prediction[:, 4:5]
+    class_ids = scores.argmax(axis=1)
+    confidences = scores[np.arange(len(scores)), class_ids]
+
+    mask = confidences > conf_threshold
+    boxes = xywh2xyxy(prediction[mask, :4])
+    confidences = confidences[mask]
+    class_ids = class_ids[mask]
+    if not len(boxes):
+        return np.zeros((0, 6), dtype=np.float32)
+
+    # Offset boxes per class so one NMS pass never suppresses across classes
+    offsets = class_ids[:, None].astype(np.float32) * 4096
+    keep = nms(boxes + offsets, confidences, iou_threshold)[:max_det]
+
+    return np.concatenate(
+        [boxes[keep], confidences[keep, None], class_ids[keep, None].astype(np.float32)],
+        axis=1
+    ).astype(np.float32)
+
+
+def predictions_to_detections(predictions, class_names):
+    """Turn (N, 6) backend output into the detection dicts the checkout UI uses"""
+    detections = []
+    for *xyxy, conf, cls in predictions:
+        detections.append({
+            'class': class_names[int(cls)],
+            'confidence': float(conf),
+            'bbox': [int(x) for x in xyxy]
+        })
+    return detections
+
+
+class InferenceBackend:
+    """
+    Common interface for detection backends.
+
+    predict() takes an HxWx3 uint8 frame in BGR order (cv2.imread, the
+    cameras' main stream) and returns an (N, 6) array of
+    [x1, y1, x2, y2, confidence, class_id] in frame pixel coordinates.
+    Backends swap to the RGB order YOLOv5 was trained on.
+
+    input_shape_for() is the (height, width) the model actually runs at for
+    a frame. Backends with `flexible_input` run small images (such as ROI
+    crops) at a small input instead of enlarging them to the full size.
+    """
+    name = "base"
+    flexible_input = False
+
+    def predict(self, frame):
+        raise NotImplementedError
+
+    def input_shape_for(self, frame):
+        raise NotImplementedError
+
+    def predict_batch(self, frames):
+        """One (N, 6) array per frame; backends that can batch override this"""
+        return [self.predict(frame) for frame in frames]
+
+
+class TorchHubBackend(InferenceBackend):
+    """YOLOv5 through torch.hub (needs network on first load and the full PyTorch stack)"""
+    name = "torch"
+    # AutoShape sizes each call's input from the images it is given
+    flexible_input = True
+
+    def __init__(self, weights_path, conf_threshold=0.25, img_size=640):
+        import torch
+        self.model = torch.hub.load('ultralytics/yolov5', 'custom', path=weights_path)
+        self.model.conf = conf_threshold
+        self.img_size = img_size
+
+    def input_shape_for(self, frame):
+        return stride_shape(frame.shape[0], frame.shape[1], self.img_size)
+
+    def predict(self, frame):
+        return self.predict_batch([frame])[0]
+
+    def predict_batch(self, frames):
+        # AutoShape runs a list of images as one batch at one size, so batch same-sized inputs together
+        groups = {}
+        for i, frame in enumerate(frames):
+            groups.setdefault(max(self.input_shape_for(frame)), []).append(i)
+        results = [None] * len(frames)
+        for size, indices in groups.items():
+            # AutoShape takes numpy images as RGB
+            preds = self.model([frames[i][..., ::-1] for i in indices], size=size).pred
+            for i, pred in zip(indices, preds):
+                results[i] = pred.cpu().numpy()
+        return results
+
+
+class OnnxRuntimeBackend(InferenceBackend):
+    """YOLOv5 exported to ONNX, run on the CPU with onnxruntime"""
+    name = "onnx"
+
+    def __init__(self, model_path, conf_threshold=0.25, iou_threshold=0.45,
+                 num_threads=None, providers=None, img_size=640):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+
+        available = ort.get_available_providers()
+        providers = [p for p in (providers or ['CPUExecutionProvider']) if p in available]
+        self.session = ort.InferenceSession(
+            model_path, options, providers=providers or ['CPUExecutionProvider']
+        )
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        # Only models exported with dynamic axes take more than one image per run
+        self.dynamic_batch = not isinstance(model_input.shape[0], int)
+        height, width = model_input.shape[2:4]
+        # Dynamic axes come through as strings; img_size then caps the longer side
+        self.dynamic_shape = not (isinstance(height, int) and isinstance(width, int))
+        self.flexible_input = self.dynamic_shape
+        self.input_shape = (
+            height if isinstance(height, int) else img_size,
+            width if isinstance(width, int) else img_size
+        )
+        self.conf_threshold = conf_threshold
+        self.iou_threshold = iou_threshold
+
+    def input_shape_for(self, frame):
+        if self.dynamic_shape:
+            return stride_shape(frame.shape[0], frame.shape[1], max(self.input_shape))
+        return self.input_shape
+
+    def preprocess(self, frame):
+        # A fixed-shape model needs every image enlarged to its input; a dynamic one only pads to the stride
+        image, ratio, pad = letterbox(frame, self.input_shape_for(frame), scaleup=not self.dynamic_shape)
+        # BGR HWC -> RGB CHW, as YOLOv5's own loader does
+        blob = image[..., ::-1].transpose(2, 0, 1)[None].astype(np.float32) / 255.0
+        return np.ascontiguousarray(blob), ratio, pad
+
+    def postprocess(self, output, ratio, pad, original_shape):
+        detections = non_max_suppression(output, self.conf_threshold, self.iou_threshold)
+        if len(detections):
+            detections[:, :4] = scale_boxes(detections[:, :4], ratio, pad, original_shape)
+        return detections
+
+    def predict(self, frame):
+        blob, ratio, pad = self.preprocess(frame)
+        output = self.session.run(None, {self.input_name: blob})[0]
+        return self.postprocess(output[0], ratio, pad, frame.shape)
+
+    def predict_batch(self, frames):
+        if not self.dynamic_batch or len(frames) == 1:
+            return super().predict_batch(frames)
+
+        # One run per input shape; frames and crops of the same size share it
+        groups = {}
+        for i, frame in enumerate(frames):
+            groups.setdefault(self.input_shape_for(frame), []).append(i)
+        results = [None] * len(frames)
+        for indices in groups.values():
+            blobs, ratios, pads = zip(*(self.preprocess(frames[i]) for i in indices))
+            outputs = self.session.run(None, {self.input_name: np.concatenate(blobs)})[0]
+            for i, output, ratio, pad in zip(indices, outputs, ratios, pads):
+                results[i] = self.postprocess(output, ratio, pad, frames[i].shape)
+        return results
+
+
+class OpenVinoBackend(OnnxRuntimeBackend):
+    """ONNX model on onnxruntime's OpenVINO provider, falling back to plain CPU"""
+    name = "openvino"
+
+    def __init__(self, model_path, **kwargs):
+        kwargs.setdefault('providers', ['OpenVINOExecutionProvider', 'CPUExecutionProvider'])
+        super().__init__(model_path, **kwargs)
+
+
+BACKENDS = {
+    'torch': TorchHubBackend,
+    'onnx': OnnxRuntimeBackend,
+    'int8': OnnxRuntimeBackend,
+    'openvino': OpenVinoBackend
+}
+
+# Model file each backend expects next to best.pt
+MODEL_SUFFIXES = {
+    'torch': '.pt',
+    'onnx': '.onnx',
+    'int8': '_int8.onnx',
+    'openvino': '.onnx'
+}
+
+
+def load_backend(name, weights_path, **kwargs):
+    """
+    Create a backend by name. 'auto' uses the ONNX export next to the
+    weights when there is one and torch.hub otherwise. 'int8' loads the
+    quantized best_int8.onnx from model_files/quantize_model.py.
+    """
+    if name == 'auto':
+        onnx_path = os.path.splitext(weights_path)[0] + '.onnx'
+        if os.path.exists(onnx_path):
+            name, weights_path = 'onnx', onnx_path
+        else:
+            name = 'torch'
+
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend: {name} (choose from {', '.join(BACKENDS)})")
+    if name != 'torch' and not weights_path.endswith('.onnx'):
+        weights_path = os.path.splitext(weights_path)[0] + MODEL_SUFFIXES[name]
+
+    return BACKENDS[name](weights_path, **kwargs)
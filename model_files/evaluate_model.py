@@ -0,0 +1,134 @@
+import os
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+# Allow imports of the checkout modules in the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from object_tracker import iou_matrix
+
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+
+def load_yolo_labels(label_path, image_shape):
+    """Read a YOLO label file into class ids and pixel [x1, y1, x2, y2] boxes"""
+    height, width = image_shape[:2]
+    if not os.path.exists(label_path):
+        return np.zeros(0, dtype=np.int64), np.zeros((0, 4), dtype=np.float32)
+
+    rows = np.loadtxt(label_path, ndmin=2, dtype=np.float32)
+    if not rows.size:
+        return np.zeros(0, dtype=np.int64), np.zeros((0, 4), dtype=np.float32)
+
+    classes = rows[:, 0].astype(np.int64)
+    xc, yc, w, h = rows[:, 1] * width, rows[:, 2] * height, rows[:, 3] * width, rows[:, 4] * height
+    boxes = np.stack([xc - w / 2, yc - h / 2, xc + w / 2, yc + h / 2], axis=1)
+    return classes, boxes
+
+def match_predictions(predictions, gt_classes, gt_boxes, iou_thresholds=IOU_THRESHOLDS):
+    """
+    Mark each prediction as a true positive per IoU threshold.
+    Each ground-truth box can be claimed by one prediction only.
+    """
+    correct = np.zeros((len(predictions), len(iou_thresholds)), dtype=bool)
+    if not len(predictions) or not len(gt_boxes):
+        return correct
+
+    iou = iou_matrix(gt_boxes, predictions[:, :4])
+    same_class = gt_classes[:, None] == predictions[:, 5].astype(np.int64)[None, :]
+
+    for t, threshold in enumerate(iou_thresholds):
+        gt_idx, pred_idx = np.nonzero((iou >= threshold) & same_class)
+        if not len(gt_idx):
+            continue
+        order = np.argsort(-iou[gt_idx, pred_idx])
+        gt_idx, pred_idx = gt_idx[order], pred_idx[order]
+        # Highest-IoU pairs first, then drop repeats of either side
+        _, first_pred = np.unique(pred_idx, return_index=True)
+        gt_idx, pred_idx = gt_idx[first_pred], pred_idx[first_pred]
+        _, first_gt = np.unique(gt_idx, return_index=True)
+        correct[pred_idx[first_gt], t] = True
+    return correct
+
+def average_precision(recall, precision):
+    """Area under the precision envelope, 101-point interpolation as in COCO"""
+    recall = np.concatenate(([0.0], recall, [1.0]))
+    precision = np.concatenate(([1.0], precision, [0.0]))
+    precision = np.flip(np.maximum.accumulate(np.flip(precision)))
+    points = np.linspace(0, 1, 101)
+    return float(np.interp(points, recall, precision).mean())
+
+def compute_map(stats, num_classes):
+    """
+    stats is a list of (correct, confidence, pred_class, gt_class) per image.
+    Returns mAP@0.5, mAP@0.5:0.95 and AP@0.5 per class.
+    """
+    correct = np.concatenate([s[0] for s in stats]) if stats else np.zeros((0, len(IOU_THRESHOLDS)), bool)
+    confidence = np.concatenate([s[1] for s in stats]) if stats else np.zeros(0)
+    pred_classes = np.concatenate([s[2] for s in stats]) if stats else np.zeros(0, np.int64)
+    gt_classes = np.concatenate([s[3] for s in stats]) if stats else np.zeros(0, np.int64)
+
+    order = np.argsort(-confidence)
+    correct, pred_classes = correct[order], pred_classes[order]
+
+    ap = np.zeros((num_classes, correct.shape[1]))
+    present = []
+    for c in range(num_classes):
+        num_gt = int((gt_classes == c).sum())
+        is_class = pred_classes == c
+        if num_gt == 0:
+            continue
+        present.append(c)
+        if not is_class.any():
+            continue
+
+        tp = np.cumsum(correct[is_class], axis=0)
+        fp = np.cumsum(~correct[is_class], axis=0)
+        recall = tp / num_gt
+        precision = tp / (tp + fp)
+        for t in range(correct.shape[1]):
+            ap[c, t] = average_precision(recall[:, t], precision[:, t])
+
+    if not present:
+        return 0.0, 0.0, ap[:, 0]
+    return float(ap[present, 0].mean()), float(ap[present].mean()), ap[:, 0]
+
+def evaluate_backend(backend, images_dir, labels_dir, num_classes, limit=None):
+    """Run a backend over a labelled image folder and report mAP and latency"""
+    image_names = sorted(
+        f for f in os.listdir(images_dir)
+        if f.lower().endswith(('.png', '.jpg', '.jpeg'))
+    )
+    if limit:
+        image_names = image_names[:limit]
+
+    stats, latencies = [], []
+    for image_name in image_names:
+        image = cv2.imread(os.path.join(images_dir, image_name))
+        if image is None:
+            print(f"Could not read image: {image_name}")
+            continue
+
+        start = time.perf_counter()
+        predictions = backend.predict(image)
+        latencies.append(time.perf_counter() - start)
+
+        label_path = os.path.join(labels_dir, os.path.splitext(image_name)[0] + '.txt')
+        gt_classes, gt_boxes = load_yolo_labels(label_path, image.shape)
+        stats.append((
+            match_predictions(predictions, gt_classes, gt_boxes),
+            predictions[:, 4],
+            predictions[:, 5].astype(np.int64),
+            gt_classes
+        ))
+
+    map50, map50_95, per_class = compute_map(stats, num_classes)
+    return {
+        'images': len(stats),
+        'map50': map50,
+        'map50_95': map50_95,
+        'ap50_per_class': per_class.tolist(),
+        'mean_latency_ms': 1000 * float(np.mean(latencies)) if latencies else 0.0
+    }
@@ -0,0 +1,68 @@
+import os
+import sys
+import subprocess
+
+# Local YOLOv5 checkout providing export.py (and, for training, the model and loss code)
+YOLOV5_DIR = os.environ.get('YOLOV5_DIR', 'yolov5')
+
+def export_onnx(weights_path="runs/train/exp/weights/best.pt", img_size=640, opset=12, simplify=True,
+                dynamic=False, yolov5_dir=YOLOV5_DIR):
+    """
+    Export trained YOLOv5 weights to ONNX with the exporter of the YOLOv5 checkout in yolov5_dir.
+    dynamic=True keeps the batch and image axes open, so multi-camera carts run every view
+    in one call and ROI crops run at their own size.
+    """
+    if not os.path.exists(weights_path):
+        raise FileNotFoundError(f"Weights not found: {weights_path}")
+    export_script = os.path.join(yolov5_dir, 'export.py')
+    if not os.path.exists(export_script):
+        raise FileNotFoundError(f"{export_script} not found, copy a YOLOv5 checkout there or set YOLOV5_DIR")
+
+    export_command = [
+        sys.executable, export_script,
+        '--weights', weights_path,
+        '--include', 'onnx',
+        '--imgsz', str(img_size),
+        '--opset', str(opset),
+        '--device', 'cpu'
+    ]
+    if simplify:
+        export_command.append('--simplify')
+    if dynamic:
+        export_command.append('--dynamic')
+
+    result = subprocess.run(export_command)
+    if result.returncode != 0:
+        raise RuntimeError(f"ONNX export failed with exit code {result.returncode}")
+
+    onnx_path = os.path.splitext(weights_path)[0] + '.onnx'
+    print(f"Exported {onnx_path}")
+    return onnx_path
+
+def check_export(onnx_path, image_path):
+    """Run the exported model once on an image and print what it finds"""
+    import cv2
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from inference_backends import OnnxRuntimeBackend
+
+    backend = OnnxRuntimeBackend(onnx_path)
+    image = cv2.imread(image_path)
+    if image is None:
+        raise FileNotFoundError(f"Could not read image: {image_path}")
+
+    for x1, y1, x2, y2, conf, cls in backend.predict(image):
+        print(f"class {int(cls)} conf {conf:.2f} box ({x1:.0f}, {y1:.0f}, {x2:.0f}, {y2:.0f})")
+
+def main():
+    weights_path = sys.argv[1] if len(sys.argv) > 1 else "runs/train/exp/weights/best.pt"
+
+    try:
+        # Dynamic axes let the checkout batch cameras and run ROI crops at their own size
+        onnx_path = export_onnx(weights_path, dynamic=True)
+        if len(sys.argv) > 2:
+            check_export(onnx_path, sys.argv[2])
+    except Exception as e:
+        print(f"Error during export: {str(e)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import os
+import sys
+import json
+from pathlib import Path
+
+import cv2
+import yaml
+
+# Allow imports of the checkout modules in the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from inference_backends import OnnxRuntimeBackend
+from evaluate_model import evaluate_backend
+
+from onnxruntime.quantization import (
+    CalibrationDataReader, CalibrationMethod, QuantFormat, QuantType, quantize_static
+)
+
+class ImageCalibrationReader(CalibrationDataReader):
+    """Feeds letterboxed dataset images to the calibrator one at a time"""
+
+    def __init__(self, model_path, images_dir, max_images=None):
+        # Same letterbox and scaling the checkout app uses at inference time
+        self.backend = OnnxRuntimeBackend(model_path)
+
+        image_names = sorted(
+            f for f in os.listdir(images_dir)
+            if f.lower().endswith(('.png', '.jpg', '.jpeg'))
+        )
+        if max_images and len(image_names) > max_images:
+            # Spread the sample evenly so every class and augmentation is seen
+            step = len(image_names) / max_images
+            image_names = [image_names[int(i * step)] for i in range(max_images)]
+
+        self.image_paths = [os.path.join(images_dir, f) for f in image_names]
+        self._iterator = iter(self.image_paths)
+
+    def get_next(self):
+        for image_path in self._iterator:
+            image = cv2.imread(image_path)
+            if image is None:
+                print(f"Could not read image: {image_path}")
+                continue
+            blob, _, _ = self.backend.preprocess(image)
+            return {self.backend.input_name: blob}
+        return None
+
+    def rewind(self):
+        self._iterator = iter(self.image_paths)
+
+def quantize_model(fp32_path, int8_path, images_dir, max_images=None, method='minmax'):
+    """
+    Post-training static INT8 quantization.
+    Only Conv weights and activations are quantized; the detect head's box
+    decoding stays in float so coordinates keep their precision.
+    """
+    methods = {
+        'minmax': CalibrationMethod.MinMax,
+        'entropy': CalibrationMethod.Entropy,
+        'percentile': CalibrationMethod.Percentile
+    }
+    reader = ImageCalibrationReader(fp32_path, images_dir, max_images)
+    print(f"Calibrating on {len(reader.image_paths)} images ({method})...")
+
+    quantize_static(
+        fp32_path,
+        int8_path,
+        reader,
+        quant_format=QuantFormat.QDQ,
+        op_types_to_quantize=['Conv'],
+        per_channel=True,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        calibrate_method=methods[method]
+    )
+    print(f"Saved INT8 model to {int8_path}")
+    return int8_path
+
+def compare_models(fp32_path, int8_path, images_dir, labels_dir, num_classes, limit=None):
+    """Evaluate both models on the labelled set and report the accuracy/speed trade-off"""
+    results = {}
+    for name, path in (('fp32', fp32_path), ('int8', int8_path)):
+        # Low threshold so the precision/recall curve is complete
+        backend = OnnxRuntimeBackend(path, conf_threshold=0.001, iou_threshold=0.6)
+        results[name] = evaluate_backend(backend, images_dir, labels_dir, num_classes, limit)
+
+    fp32, int8 = results['fp32'], results['int8']
+    results['delta'] = {
+        'map50': int8['map50'] - fp32['map50'],
+        'map50_95': int8['map50_95'] - fp32['map50_95'],
+        'speedup': fp32['mean_latency_ms'] / int8['mean_latency_ms'] if int8['mean_latency_ms'] else 0.0,
+        'size_ratio': os.path.getsize(int8_path) / os.path.getsize(fp32_path)
+    }
+
+    print(f"{'':6} {'mAP@0.5':>8} {'mAP@.5:.95':>11} {'ms/img':>8}")
+    for name in ('fp32', 'int8'):
+        r = results[name]
+        print(f"{name:6} {r['map50']:8.3f} {r['map50_95']:11.3f} {r['mean_latency_ms']:8.1f}")
+    delta = results['delta']
+    print(f"delta  {delta['map50']:+8.3f} {delta['map50_95']:+11.3f} "
+          f"  {delta['speedup']:.2f}x faster, {delta['size_ratio']:.0%} of fp32 size")
+    return results
+
+def main():
+    fp32_path = "runs/train/exp/weights/best.onnx"
+    int8_path = "runs/train/exp/weights/best_int8.onnx"
+    dataset_path = os.path.join("model_files", "yolo_dataset_20241105_134756")
+    images_dir = os.path.join(dataset_path, "train", "images")
+    labels_dir = os.path.join(dataset_path, "train", "labels")
+
+    try:
+        with open(os.path.join(dataset_path, "data.yaml"), 'r') as f:
+            num_classes = yaml.safe_load(f)['nc']
+
+        quantize_model(fp32_path, int8_path, images_dir)
+        results = compare_models(fp32_path, int8_path, images_dir, labels_dir, num_classes)
+
+        report_path = os.path.splitext(int8_path)[0] + '_report.json'
+        with open(report_path, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Report written to {report_path}")
+
+    except Exception as e:
+        print(f"Error during quantization: {str(e)}")
+
+if __name__ == "__main__":
+    main()
@@ -1,88 +1,441 @@
 import os
+import sys
+import json
+import time
 import yaml
+from copy import deepcopy
 from pathlib import Path
+import numpy as np
 import torch
-import subprocess
 import shutil
 
-def setup_yolov5():
-    """Clone YOLOv5 if it doesn't exist and install requirements"""
-    if not os.path.exists('yolov5'):
-        subprocess.run(['git', 'clone', 'https://github.com/ultralytics/yolov5.git'])
-    
-    # Install requirements
-    subprocess.run(['pip', 'install', '-r', 'yolov5/requirements.txt'])
+# Allow imports of the checkout modules in the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from data_augmentation import AugmentedDataset
+from dataset_builder import build_dataset
+from inference_backends import (
+    InferenceBackend, OnnxRuntimeBackend, letterbox, non_max_suppression, scale_boxes
+)
+from benchmark import FakePicamera2, load_frames, run_benchmark
+from evaluate_model import evaluate_backend
+from export_model import YOLOV5_DIR, export_onnx
+
+# Model variants and input sizes tried by sweep_models()
+SWEEP_MODELS = ['yolov5n', 'yolov5s', 'yolov5m']
+SWEEP_IMG_SIZES = [320, 416, 512, 640]
 
-def prepare_training_data(labeled_data_path):
-    """Prepare the data configuration file for training"""
+def prepare_training_data(labeled_data_path, val_fraction=0.2, seed=0):
+    """Split the labelled data into train/val by source photo and write the data configuration file"""
     # Find data.yaml in the labeled data directory
     data_yaml_path = os.path.join(labeled_data_path, 'data.yaml')
     
     if not os.path.exists(data_yaml_path):
         raise FileNotFoundError(f"data.yaml not found in {labeled_data_path}")
     
-    # Load and modify the data.yaml file
     with open(data_yaml_path, 'r') as f:
         data_config = yaml.safe_load(f)
     
-    # Update paths to be absolute
-    data_config['train'] = str(Path(labeled_data_path) / 'train' / 'images')
-    data_config['val'] = str(Path(labeled_data_path) / 'train' / 'images')  # Using same for validation
+    # Augmented siblings of one photo always land in the same split
+    modified_yaml_path, split_path = build_dataset(
+        labeled_data_path, val_fraction=val_fraction, seed=seed, config_path='dataset_config.yaml'
+    )
     
-    # Save modified config
-    modified_yaml_path = 'dataset_config.yaml'
-    with open(modified_yaml_path, 'w') as f:
-        yaml.dump(data_config, f)
-    
-    return modified_yaml_path, data_config['nc']
-
-def train_yolo(data_yaml_path, num_classes, epochs=20, batch_size=16, img_size=640):
-    """Train YOLOv5 model"""
-    # Select appropriate model size based on dataset
-    if num_classes < 5:
-        model_type = 'yolov5s'  # Small model for simple datasets
-    elif num_classes < 20:
-        model_type = 'yolov5m'  # Medium model for moderate datasets
+    return modified_yaml_path, split_path, data_config['nc']
+
+def yolo_collate(batch):
+    """Stack (image, labels) items into YOLOv5's (images, targets) batch layout"""
+    images, targets = [], []
+    for i, (image, labels) in enumerate(batch):
+        # BGR HWC -> RGB CHW, as YOLOv5's own loader does
+        images.append(torch.from_numpy(np.ascontiguousarray(image[:, :, ::-1].transpose(2, 0, 1))))
+        image_targets = torch.zeros((len(labels), 6))
+        image_targets[:, 0] = i
+        image_targets[:, 1:] = torch.from_numpy(labels)
+        targets.append(image_targets)
+    return torch.stack(images), torch.cat(targets)
+
+def create_augmented_dataloader(labeled_data_path, img_size=640, batch_size=16, workers=2, seed=0):
+    """
+    DataLoader that augments source images on the fly instead of reading 12 stored variants.
+    Shuffling draws from a generator seeded with `seed`; reseed loader.generator per epoch to reproduce a run.
+    """
+    dataset = AugmentedDataset(
+        str(Path(labeled_data_path) / 'train' / 'images'),
+        str(Path(labeled_data_path) / 'train' / 'labels'),
+        target_size=(img_size, img_size),
+        seed=seed
+    )
+    loader = torch.utils.data.DataLoader(
+        dataset,
+        batch_size=batch_size,
+        shuffle=True,
+        num_workers=workers,
+        collate_fn=yolo_collate,
+        persistent_workers=workers > 0,
+        generator=torch.Generator().manual_seed(seed)
+    )
+    return dataset, loader
+
+class TorchModelBackend(InferenceBackend):
+    """The model being trained, behind the same predict() interface the evaluator uses"""
+    name = "torch-train"
+
+    def __init__(self, model, img_size, device, conf_threshold=0.001, iou_threshold=0.6):
+        self.model = model
+        self.img_size = img_size
+        self.device = device
+        self.conf_threshold = conf_threshold
+        self.iou_threshold = iou_threshold
+
+    def predict(self, frame):
+        image, ratio, pad = letterbox(frame, self.img_size)
+        # BGR HWC -> RGB CHW, matching yolo_collate
+        tensor = torch.from_numpy(np.ascontiguousarray(image[:, :, ::-1].transpose(2, 0, 1)))
+        tensor = tensor.to(self.device).float()[None] / 255
+        with torch.no_grad():
+            output = self.model(tensor)[0][0].float().cpu().numpy()
+        detections = non_max_suppression(output, self.conf_threshold, self.iou_threshold)
+        if len(detections):
+            detections[:, :4] = scale_boxes(detections[:, :4], ratio, pad, frame.shape)
+        return detections
+
+def fitness(metrics):
+    # Same weighting yolov5 uses to pick best.pt
+    return 0.1 * metrics['map50'] + 0.9 * metrics['map50_95']
+
+class TrainingRunner:
+    """
+    In-process YOLOv5 training on streamed augmentations.
+
+    Uses the model and loss code of a local YOLOv5 checkout (yolov5_dir, or
+    $YOLOV5_DIR) and never touches the network when the pretrained weights
+    are on disk. Saves last.pt every epoch and best.pt on the best
+    validation fitness. Calling run() again resumes from last.pt, and
+    training stops early after `patience` epochs without improvement.
+    One JSON line of metrics per epoch goes to metrics.jsonl.
+    """
+
+    def __init__(self, split_path, num_classes, model_type='yolov5s', epochs=20, batch_size=16,
+                 img_size=640, output_dir='runs/train/exp', patience=5, yolov5_dir=YOLOV5_DIR,
+                 weights=None, workers=2, seed=0):
+        self.split_path = split_path
+        self.num_classes = num_classes
+        self.model_type = model_type
+        self.epochs = epochs
+        self.batch_size = batch_size
+        self.img_size = img_size
+        self.patience = patience
+        self.yolov5_dir = Path(yolov5_dir)
+        self.weights = weights
+        self.workers = workers
+        self.seed = seed
+
+        self.output_dir = Path(output_dir)
+        self.weights_dir = self.output_dir / 'weights'
+        self.last_path = self.weights_dir / 'last.pt'
+        self.best_path = self.weights_dir / 'best.pt'
+        self.metrics_path = self.output_dir / 'metrics.jsonl'
+        self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+
+    def import_yolov5(self):
+        if not (self.yolov5_dir / 'models' / 'yolo.py').exists():
+            raise FileNotFoundError(
+                f"No YOLOv5 checkout at {self.yolov5_dir}; copy one there or set YOLOV5_DIR"
+            )
+        # Checkpoints pickle yolov5's classes, so its modules must be importable before torch.load
+        if str(self.yolov5_dir.resolve()) not in sys.path:
+            sys.path.insert(0, str(self.yolov5_dir.resolve()))
+
+    def pretrained_path(self):
+        """Local pretrained weights for the model type, if any"""
+        candidates = [self.weights] if self.weights else [
+            f'{self.model_type}.pt',
+            self.yolov5_dir / f'{self.model_type}.pt',
+            Path('model_files') / f'{self.model_type}.pt'
+        ]
+        for candidate in candidates:
+            if candidate and os.path.exists(candidate):
+                return candidate
+        return None
+
+    def build_model(self):
+        from models.yolo import Model
+
+        pretrained = self.pretrained_path()
+        if pretrained is None:
+            print(f"No pretrained {self.model_type}.pt found, training from scratch")
+            return Model(str(self.yolov5_dir / 'models' / f'{self.model_type}.yaml'), ch=3, nc=self.num_classes)
+
+        # Start from the pretrained checkpoint, keeping layers whose shapes still match
+        checkpoint = torch.load(pretrained, map_location='cpu', weights_only=False)
+        model = Model(checkpoint['model'].yaml, ch=3, nc=self.num_classes)
+        state = checkpoint['model'].float().state_dict()
+        own = model.state_dict()
+        model.load_state_dict({k: v for k, v in state.items() if k in own and own[k].shape == v.shape}, strict=False)
+        print(f"Initialised from {pretrained}")
+        return model
+
+    def setup(self):
+        from utils.loss import ComputeLoss
+
+        torch.manual_seed(self.seed)
+        with open(self.yolov5_dir / 'data' / 'hyps' / 'hyp.scratch-low.yaml', 'r') as f:
+            hyp = yaml.safe_load(f)
+
+        self.model = self.build_model().to(self.device)
+
+        # Loss gains scaled for class count and image size, as yolov5/train.py does
+        num_layers = self.model.model[-1].nl
+        hyp['box'] *= 3 / num_layers
+        hyp['cls'] *= self.num_classes / 80 * 3 / num_layers
+        hyp['obj'] *= (self.img_size / 640) ** 2 * 3 / num_layers
+        self.model.hyp = hyp
+        self.model.nc = self.num_classes
+        self.compute_loss = ComputeLoss(self.model)
+
+        self.optimizer = torch.optim.SGD(
+            self.model.parameters(), lr=hyp['lr0'], momentum=hyp['momentum'], nesterov=True
+        )
+        # Linear decay to lr0 * lrf over the run
+        self.scheduler = torch.optim.lr_scheduler.LambdaLR(
+            self.optimizer, lambda epoch: (1 - epoch / self.epochs) * (1.0 - hyp['lrf']) + hyp['lrf']
+        )
+        self.dataset, self.loader = create_augmented_dataloader(
+            self.split_path, self.img_size, self.batch_size, self.workers, self.seed
+        )
+
+        self.start_epoch = 0
+        self.best_fitness = -1.0
+        self.epochs_without_improvement = 0
+        self.finished = False
+
+    def resume(self):
+        """Continue from last.pt if an earlier run of this config was interrupted"""
+        if not self.last_path.exists():
+            return
+        checkpoint = torch.load(self.last_path, map_location=self.device, weights_only=False)
+        self.model.load_state_dict(checkpoint['model'].float().state_dict())
+        self.optimizer.load_state_dict(checkpoint['optimizer'])
+        self.scheduler.load_state_dict(checkpoint['scheduler'])
+        self.start_epoch = checkpoint['epoch'] + 1
+        self.best_fitness = checkpoint['best_fitness']
+        self.epochs_without_improvement = checkpoint['epochs_without_improvement']
+        self.finished = checkpoint.get('finished', False)
+        print(f"Resuming from {self.last_path} at epoch {self.start_epoch + 1}/{self.epochs}")
+
+    def save_checkpoint(self, epoch, path):
+        # Same 'model' entry as yolov5/train.py so export and torch.hub can load it
+        checkpoint = {
+            'epoch': epoch,
+            'model': deepcopy(self.model).half(),
+            'optimizer': self.optimizer.state_dict(),
+            'scheduler': self.scheduler.state_dict(),
+            'best_fitness': self.best_fitness,
+            'epochs_without_improvement': self.epochs_without_improvement,
+            'finished': self.finished
+        }
+        # Write then rename so an interruption never leaves a truncated checkpoint
+        temp_path = path.with_suffix('.tmp')
+        torch.save(checkpoint, temp_path)
+        os.replace(temp_path, path)
+
+    def train_epoch(self, epoch):
+        self.dataset.set_epoch(epoch)
+        # Shuffle order depends only on (seed, epoch), so a resumed run matches an uninterrupted one
+        self.loader.generator.manual_seed(int(np.random.SeedSequence([self.seed, epoch]).generate_state(1)[0]))
+        self.model.train()
+        epoch_loss = 0.0
+        for images, targets in self.loader:
+            images = images.to(self.device).float() / 255
+            loss, _ = self.compute_loss(self.model(images), targets.to(self.device))
+            self.optimizer.zero_grad()
+            loss.backward()
+            self.optimizer.step()
+            epoch_loss += loss.item()
+        self.scheduler.step()
+        return epoch_loss / max(len(self.loader), 1)
+
+    def validate(self):
+        self.model.eval()
+        backend = TorchModelBackend(self.model, self.img_size, self.device)
+        return evaluate_backend(
+            backend,
+            os.path.join(self.split_path, 'val', 'images'),
+            os.path.join(self.split_path, 'val', 'labels'),
+            self.num_classes
+        )
+
+    def log_metrics(self, record):
+        with open(self.metrics_path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+    def run(self):
+        """Train to completion or early stop; returns the path of best.pt"""
+        self.import_yolov5()
+        self.weights_dir.mkdir(parents=True, exist_ok=True)
+        self.setup()
+        self.resume()
+        if self.finished:
+            print(f"{self.output_dir} already finished training")
+            return self.best_path
+
+        print(f"Training {self.model_type} @ {self.img_size} on {len(self.dataset)} streamed samples per epoch "
+              f"from {len(self.dataset.image_names)} source images")
+        for epoch in range(self.start_epoch, self.epochs):
+            start = time.perf_counter()
+            train_loss = self.train_epoch(epoch)
+            metrics = self.validate()
+
+            score = fitness(metrics)
+            improved = score > self.best_fitness
+            if improved:
+                self.best_fitness = score
+                self.epochs_without_improvement = 0
+            else:
+                self.epochs_without_improvement += 1
+            self.finished = epoch == self.epochs - 1 or self.epochs_without_improvement >= self.patience
+
+            self.save_checkpoint(epoch, self.last_path)
+            if improved:
+                shutil.copyfile(self.last_path, self.best_path)
+
+            self.log_metrics({
+                'epoch': epoch + 1,
+                'train_loss': train_loss,
+                'map50': metrics['map50'],
+                'map50_95': metrics['map50_95'],
+                'lr': self.optimizer.param_groups[0]['lr'],
+                'epoch_time_s': time.perf_counter() - start
+            })
+            print(f"Epoch {epoch + 1}/{self.epochs} loss {train_loss:.4f} "
+                  f"mAP@0.5 {metrics['map50']:.3f} mAP@.5:.95 {metrics['map50_95']:.3f}")
+
+            if self.finished and epoch < self.epochs - 1:
+                print(f"Early stopping: no improvement for {self.patience} epochs")
+                break
+
+        return self.best_path
+
+def train_yolo_streaming(labeled_data_path, num_classes, epochs=20, batch_size=16, img_size=640,
+                         model_type='yolov5s', output_dir='runs/train/exp', **kwargs):
+    """Train (or resume training) one config with TrainingRunner; returns best.pt"""
+    runner = TrainingRunner(
+        labeled_data_path, num_classes, model_type=model_type, epochs=epochs,
+        batch_size=batch_size, img_size=img_size, output_dir=output_dir, **kwargs
+    )
+    return runner.run()
+
+def measure_latency(onnx_path, frames, class_names, num_frames=100):
+    """Per-frame latency of the checkout path (benchmark.py harness) on this machine's CPU"""
+    backend = OnnxRuntimeBackend(onnx_path, conf_threshold=0.25)
+    results = run_benchmark(FakePicamera2(frames), backend, class_names, num_frames, warmup=5)
+    return {
+        'latency_p50_ms': results['stages']['total']['p50_ms'],
+        'latency_p95_ms': results['stages']['total']['p95_ms'],
+        'fps': results['throughput_fps']
+    }
+
+def pareto_front(results):
+    """Configs not beaten on both latency and mAP@.5:.95 by any other"""
+    front, best_map = [], -1.0
+    for result in sorted(results, key=lambda r: (r['latency_p50_ms'], -r['map50_95'])):
+        if result['map50_95'] > best_map:
+            front.append(result)
+            best_map = result['map50_95']
+    return front
+
+def recommend_config(results, target_fps):
+    """Most accurate config that reaches target_fps, or the fastest one if none does"""
+    fast_enough = [r for r in results if r['fps'] >= target_fps]
+    if fast_enough:
+        return max(fast_enough, key=lambda r: (r['map50_95'], r['fps']))
+    return max(results, key=lambda r: r['fps'])
+
+def print_sweep_report(results, front, recommended, target_fps):
+    print(f"{'model':<9} {'size':>5} {'mAP@0.5':>8} {'mAP@.5:.95':>11} {'p50 ms':>8} {'FPS':>6}  pareto")
+    for r in sorted(results, key=lambda r: r['latency_p50_ms']):
+        marker = '*' if r in front else ''
+        print(f"{r['model']:<9} {r['img_size']:5d} {r['map50']:8.3f} {r['map50_95']:11.3f} "
+              f"{r['latency_p50_ms']:8.1f} {r['fps']:6.1f}  {marker}")
+    if recommended['fps'] >= target_fps:
+        print(f"Recommended for {target_fps} FPS: {recommended['model']} @ {recommended['img_size']}")
     else:
-        model_type = 'yolov5l'  # Large model for complex datasets
-    
-    print(f"Training {model_type} model for {num_classes} classes...")
-    
-    # Training command
-    train_command = [
-        'python', 'yolov5/train.py',
-        '--img', str(img_size),
-        '--batch', str(batch_size),
-        '--epochs', str(epochs),
-        '--data', data_yaml_path,
-        '--weights', f'{model_type}.pt',
-        '--cache'
-    ]
-    
-    # Run training
-    subprocess.run(train_command)
+        print(f"No config reaches {target_fps} FPS; fastest is {recommended['model']} @ {recommended['img_size']}")
+
+def sweep_models(split_path, num_classes, class_names, models=SWEEP_MODELS, img_sizes=SWEEP_IMG_SIZES,
+                 epochs=20, batch_size=16, target_fps=10, output_dir='runs/sweep', yolov5_dir=YOLOV5_DIR):
+    """
+    Train every model variant at every input size, then score each on the
+    validation split (mAP) and on the CPU it runs on (latency). Run it on
+    the Pi, or copy the exported models there, for latency that matches checkout.
+    Each config trains in its own run directory, so an interrupted sweep
+    resumes where it stopped and finished configs are not retrained.
+    """
+    val_images = os.path.join(split_path, 'val', 'images')
+    val_labels = os.path.join(split_path, 'val', 'labels')
+    frames = load_frames(val_images, limit=50)
+
+    results = []
+    for model_type in models:
+        for img_size in img_sizes:
+            run_dir = Path(output_dir) / f"{model_type}_{img_size}"
+            print(f"Sweep: {model_type} @ {img_size}")
+            try:
+                weights_path = train_yolo_streaming(
+                    split_path, num_classes, epochs, batch_size, img_size,
+                    model_type=model_type, output_dir=str(run_dir), yolov5_dir=yolov5_dir
+                )
+                onnx_path = export_onnx(str(weights_path), img_size, yolov5_dir=yolov5_dir)
+
+                # Low threshold so the precision/recall curve is complete
+                backend = OnnxRuntimeBackend(onnx_path, conf_threshold=0.001, iou_threshold=0.6)
+                metrics = evaluate_backend(backend, val_images, val_labels, num_classes)
+                result = {'model': model_type, 'img_size': img_size, 'onnx_path': onnx_path,
+                          'map50': metrics['map50'], 'map50_95': metrics['map50_95']}
+                result.update(measure_latency(onnx_path, frames, class_names))
+                results.append(result)
+            except Exception as e:
+                print(f"Error in sweep run {model_type} @ {img_size}: {str(e)}")
+
+    if not results:
+        raise RuntimeError("No sweep run completed")
+
+    front = pareto_front(results)
+    recommended = recommend_config(results, target_fps)
+    print_sweep_report(results, front, recommended, target_fps)
+
+    report = {'target_fps': target_fps, 'results': results, 'pareto': front, 'recommended': recommended}
+    report_path = Path(output_dir) / 'sweep_report.json'
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {report_path}")
+    return report
 
 def main():
     # Path to your labeled dataset
-    labeled_data_path = r"C:\Users\Suman_PC\Documents\GitHub\smart_checkout_system\model_files\yolo_dataset_20241105_134756"  # Update this with your dataset timestamp
+    labeled_data_path = os.path.join("model_files", "yolo_dataset_20241105_134756")  # Update this with your dataset timestamp
+    # Sweep model size x input size for the checkout's frame rate instead of a single training run
+    run_sweep = False
+    target_fps = 10
     
     try:
-        # Setup YOLOv5
-        setup_yolov5()
-        
         # Prepare data
-        data_yaml_path, num_classes = prepare_training_data(labeled_data_path)
-        
-        # Train model
-        train_yolo(
-            data_yaml_path=data_yaml_path,
-            num_classes=num_classes,
-            epochs=10,
-            batch_size=8,  # Adjust based on your GPU memory
-            img_size=640
-        )
+        data_yaml_path, split_path, num_classes = prepare_training_data(labeled_data_path)
         
-        print("Training completed! Check the 'runs/train' folder for results.")
+        # Train model (re-running picks up from the last finished epoch)
+        if run_sweep:
+            with open(data_yaml_path, 'r') as f:
+                class_names = yaml.safe_load(f)['names']
+            sweep_models(split_path, num_classes, class_names, epochs=10, batch_size=8, target_fps=target_fps)
+        else:
+            best_path = train_yolo_streaming(
+                split_path,
+                num_classes=num_classes,
+                epochs=10,
+                batch_size=8,  # Adjust based on your GPU memory
+                img_size=640
+            )
+            print(f"Training completed! Best weights: {best_path}")
         
     except Exception as e:
         print(f"Error during training: {str(e)}")
@@ -0,0 +1,151 @@
+import itertools
+from collections import Counter
+
+import numpy as np
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """Pairwise IoU between two sets of [x1, y1, x2, y2] boxes"""
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def centroid_distance_matrix(boxes_a, boxes_b):
+    """Pairwise centre distance, relative to the diagonal of each box in boxes_a"""
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+
+    centres_a = (a[:, :2] + a[:, 2:]) / 2
+    centres_b = (b[:, :2] + b[:, 2:]) / 2
+    diagonals = np.linalg.norm(a[:, 2:] - a[:, :2], axis=1) + 1e-9
+    distances = np.linalg.norm(centres_a[:, None, :] - centres_b[None, :, :], axis=2)
+    return distances / diagonals[:, None]
+
+
+def greedy_match(scores, threshold):
+    """Pick (row, col) pairs by descending score, each row/col used once"""
+    if scores.size == 0:
+        return []
+
+    rows, cols = np.unravel_index(np.argsort(-scores, axis=None), scores.shape)
+    used_rows, used_cols, pairs = set(), set(), []
+    for row, col in zip(rows, cols):
+        if scores[row, col] < threshold:
+            break
+        if row in used_rows or col in used_cols:
+            continue
+        used_rows.add(row)
+        used_cols.add(col)
+        pairs.append((int(row), int(col)))
+    return pairs
+
+
+class Track:
+    def __init__(self, track_id, detection):
+        self.track_id = track_id
+        self.bbox = np.asarray(detection['bbox'], dtype=np.float32)
+        self.velocity = np.zeros(4, dtype=np.float32)
+        self.confidence = detection['confidence']
+        self.class_votes = Counter({detection['class']: 1})
+        self.class_name = detection['class']
+        self.hits = 1
+        self.missed = 0
+
+    def predict(self):
+        """Expected box in the next frame under constant velocity"""
+        return self.bbox + self.velocity
+
+    def update(self, detection, min_hits):
+        bbox = np.asarray(detection['bbox'], dtype=np.float32)
+        self.velocity = bbox - self.bbox
+        self.bbox = bbox
+        self.confidence = detection['confidence']
+        self.hits += 1
+        self.missed = 0
+
+        # Settle the class by vote, then stop re-classifying the object
+        if self.hits <= min_hits:
+            self.class_votes[detection['class']] += 1
+            self.class_name = self.class_votes.most_common(1)[0][0]
+
+    def mark_missed(self):
+        self.missed += 1
+        self.velocity *= 0.5
+
+    def as_detection(self):
+        return {
+            'class': self.class_name,
+            'confidence': self.confidence,
+            'bbox': [int(x) for x in self.bbox],
+            'track_id': self.track_id
+        }
+
+
+class ObjectTracker:
+    """
+    SORT-style tracker giving detections stable IDs across frames.
+
+    Detections are matched to tracks by IoU against each track's predicted
+    box, with a centroid-distance pass for fast-moving objects that no
+    longer overlap. A track's class is decided by vote over its first
+    `min_hits` frames and then kept, so later frames only move the box.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_centroid_distance=0.5, max_missed=10, min_hits=2):
+        self.iou_threshold = iou_threshold
+        self.max_centroid_distance = max_centroid_distance
+        self.max_missed = max_missed
+        self.min_hits = min_hits
+
+        self.tracks = []
+        self._ids = itertools.count(1)
+
+    def update(self, detections):
+        """Feed one frame of detections, return the confirmed, visible tracks"""
+        unmatched_dets = list(range(len(detections)))
+        unmatched_tracks = list(range(len(self.tracks)))
+
+        if self.tracks and detections:
+            predicted = np.stack([track.predict() for track in self.tracks])
+            boxes = np.array([det['bbox'] for det in detections], dtype=np.float32)
+
+            pairs = greedy_match(iou_matrix(predicted, boxes), self.iou_threshold)
+            matched_tracks = {t for t, _ in pairs}
+            matched_dets = {d for _, d in pairs}
+            unmatched_tracks = [t for t in unmatched_tracks if t not in matched_tracks]
+            unmatched_dets = [d for d in unmatched_dets if d not in matched_dets]
+
+            # Second pass on centroids for whatever IoU could not pair
+            if unmatched_tracks and unmatched_dets:
+                distances = centroid_distance_matrix(predicted[unmatched_tracks], boxes[unmatched_dets])
+                for t, d in greedy_match(-distances, -self.max_centroid_distance):
+                    pairs.append((unmatched_tracks[t], unmatched_dets[d]))
+                matched_tracks = {t for t, _ in pairs}
+                matched_dets = {d for _, d in pairs}
+                unmatched_tracks = [t for t in unmatched_tracks if t not in matched_tracks]
+                unmatched_dets = [d for d in unmatched_dets if d not in matched_dets]
+
+            for t, d in pairs:
+                self.tracks[t].update(detections[d], self.min_hits)
+
+        for t in unmatched_tracks:
+            self.tracks[t].mark_missed()
+        for d in unmatched_dets:
+            self.tracks.append(Track(next(self._ids), detections[d]))
+
+        self.tracks = [track for track in self.tracks if track.missed <= self.max_missed]
+        return [
+            track.as_detection() for track in self.tracks
+            if track.hits >= self.min_hits and track.missed == 0
+        ]
+
+    def reset(self):
+        self.tracks = []
@@ -0,0 +1,283 @@
+import csv
+import os
+import queue
+import re
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import Future
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS customers (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    contact TEXT UNIQUE NOT NULL,   -- indexed through the UNIQUE constraint
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS orders (
+    id INTEGER PRIMARY KEY,
+    customer_id INTEGER NOT NULL REFERENCES customers(id),
+    created_at REAL NOT NULL,
+    item_count INTEGER NOT NULL,
+    total TEXT,                     -- decimal string, tax included
+    synced_at REAL                  -- set once the sync agent has uploaded the order
+);
+CREATE TABLE IF NOT EXISTS line_items (
+    order_id INTEGER NOT NULL REFERENCES orders(id) ON DELETE CASCADE,
+    class_name TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    sku TEXT,
+    unit_price TEXT                 -- decimal string, before tax
+);
+CREATE INDEX IF NOT EXISTS idx_orders_customer ON orders(customer_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_line_items_order ON line_items(order_id);
+"""
+
+# Columns added after the first release, for databases created before them
+ADDED_COLUMNS = {
+    'orders': [('total', 'TEXT'), ('synced_at', 'REAL')],
+    'line_items': [('sku', 'TEXT'), ('unit_price', 'TEXT')]
+}
+# Indexes on added columns, created once the columns exist
+ADDED_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_orders_synced ON orders(synced_at, id)"
+]
+
+def connect(db_path):
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    # WAL lets lookups read while the writer thread commits
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA foreign_keys = ON")
+    return conn
+
+class OrderStore:
+    """
+    Checkout orders in SQLite (customers, orders, line items).
+
+    submit() only queues the order; a writer thread commits whatever has
+    queued up in one transaction, so the UI never waits on the SD card.
+    Each submit returns a Future that resolves to the order id, or raises
+    if that order could not be written. close() writes everything still
+    queued.
+    """
+
+    def __init__(self, db_path, batch_size=50):
+        self.db_path = str(db_path)
+        self.batch_size = batch_size
+
+        self.write_conn = connect(self.db_path)
+        # SQLite has one writer at a time; everything that writes shares this connection
+        self.write_lock = threading.Lock()
+        self.write_conn.executescript(SCHEMA)
+        self._add_missing_columns()
+        self.read_conn = connect(self.db_path)
+        self.read_lock = threading.Lock()
+
+        self.queue = queue.Queue()
+        self.writer = threading.Thread(target=self._write_loop, name="order-writer", daemon=True)
+        self.writer.start()
+
+    def _add_missing_columns(self):
+        with self.write_conn:
+            for table, columns in ADDED_COLUMNS.items():
+                existing = {row[1] for row in self.write_conn.execute(f"PRAGMA table_info({table})")}
+                for column, column_type in columns:
+                    if column not in existing:
+                        self.write_conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+            for statement in ADDED_INDEXES:
+                self.write_conn.execute(statement)
+
+    def submit(self, name, contact, lines, created_at=None, total=None):
+        """
+        Queue one order. lines are (class_name, quantity) or
+        (class_name, quantity, sku, unit_price) tuples.
+        """
+        future = Future()
+        self.queue.put((name, contact, list(lines), created_at or time.time(), total, future))
+        return future
+
+    def _write_loop(self):
+        while True:
+            order = self.queue.get()
+            if order is None:
+                break
+            batch = [order]
+            # Take whatever else is already waiting, up to one batch
+            while len(batch) < self.batch_size:
+                try:
+                    order = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if order is None:
+                    self._write_batch(batch)
+                    return
+                batch.append(order)
+            self._write_batch(batch)
+
+    def _write_batch(self, batch):
+        try:
+            order_ids = []
+            with self.write_lock, self.write_conn:
+                for name, contact, lines, created_at, total, _ in batch:
+                    order_ids.append(self._insert_order(name, contact, lines, created_at, total))
+        except Exception as e:
+            # The transaction rolled back; one bad order must not fail the rest of the batch
+            if len(batch) > 1:
+                print(f"Error writing {len(batch)} orders, retrying one at a time: {e}")
+                for order in batch:
+                    self._write_batch([order])
+                return
+            print(f"Error writing order: {e}")
+            batch[0][-1].set_exception(e)
+            return
+        for (*_, future), order_id in zip(batch, order_ids):
+            future.set_result(order_id)
+
+    def _insert_order(self, name, contact, lines, created_at, total):
+        # Latest name wins for a returning contact number
+        self.write_conn.execute(
+            "INSERT INTO customers (name, contact, created_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(contact) DO UPDATE SET name = excluded.name",
+            (name, contact, created_at)
+        )
+        customer_id, = self.write_conn.execute(
+            "SELECT id FROM customers WHERE contact = ?", (contact,)
+        ).fetchone()
+        lines = [tuple(line) + (None,) * (4 - len(line)) for line in lines]
+        order_id = self.write_conn.execute(
+            "INSERT INTO orders (customer_id, created_at, item_count, total) VALUES (?, ?, ?, ?)",
+            (customer_id, created_at, sum(line[1] for line in lines), None if total is None else str(total))
+        ).lastrowid
+        self.write_conn.executemany(
+            "INSERT INTO line_items (order_id, class_name, quantity, sku, unit_price) VALUES (?, ?, ?, ?, ?)",
+            [
+                (order_id, class_name, quantity, sku, None if unit_price is None else str(unit_price))
+                for class_name, quantity, sku, unit_price in lines
+            ]
+        )
+        return order_id
+
+    def orders_for_contact(self, contact, limit=20):
+        """Most recent orders of a customer as dicts with their line items"""
+        with self.read_lock:
+            rows = self.read_conn.execute(
+                "SELECT o.id, c.name, o.created_at, o.item_count, o.total FROM orders o "
+                "JOIN customers c ON c.id = o.customer_id "
+                "WHERE c.contact = ? ORDER BY o.created_at DESC LIMIT ?",
+                (contact, limit)
+            ).fetchall()
+            orders = []
+            for order_id, name, created_at, item_count, total in rows:
+                lines = self.read_conn.execute(
+                    "SELECT class_name, quantity, sku, unit_price FROM line_items WHERE order_id = ?", (order_id,)
+                ).fetchall()
+                orders.append({
+                    'order_id': order_id,
+                    'name': name,
+                    'contact': contact,
+                    'created_at': created_at,
+                    'item_count': item_count,
+                    'total': total,
+                    'lines': lines
+                })
+        return orders
+
+    def pending_orders(self, limit=100):
+        """Oldest orders not uploaded yet, with customer and line items, for the sync agent"""
+        with self.read_lock:
+            rows = self.read_conn.execute(
+                "SELECT o.id, c.name, c.contact, o.created_at, o.item_count, o.total FROM orders o "
+                "JOIN customers c ON c.id = o.customer_id "
+                "WHERE o.synced_at IS NULL ORDER BY o.id LIMIT ?",
+                (limit,)
+            ).fetchall()
+            orders = []
+            for order_id, name, contact, created_at, item_count, total in rows:
+                lines = self.read_conn.execute(
+                    "SELECT class_name, quantity, sku, unit_price FROM line_items WHERE order_id = ?", (order_id,)
+                ).fetchall()
+                orders.append({
+                    'order_id': order_id,
+                    'name': name,
+                    'contact': contact,
+                    'created_at': created_at,
+                    'item_count': item_count,
+                    'total': total,
+                    'lines': [
+                        {'class': class_name, 'quantity': quantity, 'sku': sku, 'unit_price': unit_price}
+                        for class_name, quantity, sku, unit_price in lines
+                    ]
+                })
+        return orders
+
+    def mark_synced(self, order_ids, synced_at=None):
+        # On the write connection, so it waits for the order writer instead of holding up lookups on read_lock
+        with self.write_lock, self.write_conn:
+            self.write_conn.executemany(
+                "UPDATE orders SET synced_at = ? WHERE id = ?",
+                [(synced_at or time.time(), order_id) for order_id in order_ids]
+            )
+
+    def customer_name(self, contact):
+        with self.read_lock:
+            row = self.read_conn.execute("SELECT name FROM customers WHERE contact = ?", (contact,)).fetchone()
+        return row[0] if row else None
+
+    def stats(self):
+        with self.read_lock:
+            customers, = self.read_conn.execute("SELECT COUNT(*) FROM customers").fetchone()
+            orders, items, unsynced = self.read_conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(item_count), 0), COUNT(*) - COUNT(synced_at) FROM orders"
+            ).fetchone()
+        return {'customers': customers, 'orders': orders, 'items': items, 'unsynced': unsynced}
+
+    def close(self):
+        """Write everything still queued, then close the database"""
+        self.queue.put(None)
+        self.writer.join()
+        self.write_conn.close()
+        with self.read_lock:
+            self.read_conn.close()
+
+def parse_items(items_str):
+    """
+    Item column of the old CSV -> [(name, quantity)]. The checkout wrote one
+    entry per unit with its confidence, 'maggi (0.87), maggi (0.85), appy (0.91)',
+    so confidences are dropped and repeats counted; 'maggi x2' also parses.
+    """
+    counts = {}
+    for item in filter(None, (part.strip() for part in items_str.split(','))):
+        item = re.sub(r'\s*\([\d.]+\)$', '', item)
+        name, _, quantity = item.rpartition(' x')
+        if not (name and quantity.isdigit()):
+            name, quantity = item, '1'
+        counts[name] = counts.get(name, 0) + int(quantity)
+    return list(counts.items())
+
+def import_csv(store, csv_path):
+    """Load orders from the old customer_details.csv (header optional, items column optional)"""
+    count = 0
+    with open(csv_path, 'r', newline='') as f:
+        for line_number, row in enumerate(csv.reader(f), 1):
+            if not any(field.strip() for field in row) or row[:2] == ["Name", "Contact"]:
+                continue
+            if len(row) < 2 or not row[1].strip():
+                print(f"Skipping line {line_number} of {csv_path}: no contact number")
+                continue
+            name, contact = row[0].strip(), row[1].strip()
+            lines = parse_items(row[2]) if len(row) > 2 else []
+            store.submit(name, contact, lines, created_at=os.path.getmtime(csv_path))
+            count += 1
+    return count
+
+if __name__ == "__main__":
+    store = OrderStore(sys.argv[1] if len(sys.argv) > 1 else "orders.sqlite")
+    if len(sys.argv) > 2:
+        print(f"Imported {import_csv(store, sys.argv[2])} orders from {sys.argv[2]}")
+    store.close()
+
+    store = OrderStore(store.db_path)
+    print(store.stats())
+    store.close()
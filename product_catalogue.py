@@ -0,0 +1,115 @@
+import os
+import threading
+from decimal import Decimal, ROUND_HALF_UP
+
+import yaml
+
+# Next to the code, not the working directory, so the app can be started from anywhere
+CATALOGUE_PATH = os.environ.get(
+    "CHECKOUT_CATALOGUE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "catalogue.yaml")
+)
+CENT = Decimal("0.01")
+
+def money(value):
+    return Decimal(str(value)).quantize(CENT, rounding=ROUND_HALF_UP)
+
+class Product:
+    __slots__ = ('class_name', 'sku', 'name', 'price', 'tax_rate', 'weight_g', 'barcode')
+
+    def __init__(self, class_name, sku, name=None, price=0, tax_rate=0, weight_g=0, barcode=""):
+        self.class_name = class_name
+        self.sku = sku
+        self.name = name or class_name
+        self.price = money(price)
+        self.tax_rate = Decimal(str(tax_rate))
+        self.weight_g = float(weight_g)
+        self.barcode = str(barcode or "")
+
+    @property
+    def tax(self):
+        """Tax on one unit; prices are before tax"""
+        return (self.price * self.tax_rate).quantize(CENT, rounding=ROUND_HALF_UP)
+
+class ProductCatalogue:
+    """
+    Products keyed by model class, loaded once into dicts.
+
+    lookup() by class name and by_class_id() by model class index are plain
+    dict/list reads. reload_if_changed() re-reads the file only when its
+    modification time moved, and swaps the whole index in one assignment.
+    """
+
+    def __init__(self, path=CATALOGUE_PATH, class_names=None):
+        self.path = path
+        self.class_names = list(class_names or [])
+        self._lock = threading.Lock()
+        self._mtime = None
+        self.products = {}
+        self.by_sku = {}
+        self.by_id = []
+        self.reload()
+
+    def reload(self):
+        with open(self.path, 'r') as f:
+            entries = (yaml.safe_load(f) or {}).get('products', [])
+
+        products = {}
+        for entry in entries:
+            entry = dict(entry)
+            product = Product(entry.pop('class'), **entry)
+            products[product.class_name] = product
+
+        with self._lock:
+            self.products = products
+            self.by_sku = {product.sku: product for product in products.values()}
+            self.by_id = [products.get(name) for name in self.class_names]
+            self._mtime = os.path.getmtime(self.path)
+
+        missing = [name for name in self.class_names if name not in products]
+        if missing:
+            print(f"Catalogue has no product for: {', '.join(missing)}")
+
+    def reload_if_changed(self):
+        """Reload after the file was edited; True if it was"""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return False
+        if mtime == self._mtime:
+            return False
+        try:
+            self.reload()
+        except Exception as e:
+            # Keep serving the last good catalogue while the file is half-written or invalid
+            print(f"Error reloading catalogue: {e}")
+            self._mtime = mtime
+            return False
+        return True
+
+    def lookup(self, class_name):
+        return self.products.get(class_name)
+
+    def by_class_id(self, class_id):
+        return self.by_id[class_id] if 0 <= class_id < len(self.by_id) else None
+
+class CartTotals:
+    """Running subtotal, tax and weight, adjusted per item added or removed"""
+
+    def __init__(self):
+        self.subtotal = Decimal("0.00")
+        self.tax = Decimal("0.00")
+        self.weight_g = 0.0
+
+    def add(self, product, quantity=1):
+        if product is None:
+            return
+        self.subtotal += product.price * quantity
+        self.tax += product.tax * quantity
+        self.weight_g += product.weight_g * quantity
+
+    def remove(self, product, quantity=1):
+        self.add(product, -quantity)
+
+    @property
+    def total(self):
+        return self.subtotal + self.tax
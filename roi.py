@@ -0,0 +1,176 @@
+import math
+
+import cv2
+import numpy as np
+
+def merge_boxes(boxes):
+    """Union overlapping [x1, y1, x2, y2] boxes until none overlap"""
+    boxes = [list(box) for box in boxes]
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(boxes)):
+            for j in range(i + 1, len(boxes)):
+                a, b = boxes[i], boxes[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    boxes[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                    del boxes[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return boxes
+
+def offset_predictions(predictions, region):
+    """Shift (N, 6) predictions from crop coordinates back to the full frame"""
+    predictions = predictions.copy()
+    predictions[:, [0, 2]] += region[0]
+    predictions[:, [1, 3]] += region[1]
+    return predictions
+
+def centers_inside(predictions, regions):
+    """Mask of predictions whose box center falls in any of the regions"""
+    centers_x = (predictions[:, 0] + predictions[:, 2]) / 2
+    centers_y = (predictions[:, 1] + predictions[:, 3]) / 2
+    inside = np.zeros(len(predictions), dtype=bool)
+    for x1, y1, x2, y2 in regions:
+        inside |= (centers_x >= x1) & (centers_x < x2) & (centers_y >= y1) & (centers_y < y2)
+    return inside
+
+class RegionSelector:
+    """
+    Picks the parts of each camera frame worth running the detector on.
+
+    Every camera has a static ROI (fractions of the frame, from the
+    calibration UI) around the basket. Inside it, regions that changed since
+    the last detection for that camera become the crops; when nothing
+    localised moved, too much moved, or every `full_every` runs, the whole
+    ROI is used so stationary items stay tracked.
+    """
+
+    def __init__(self, static_rois=None, motion_threshold=25, downsample=8, padding=24,
+                 min_size=96, max_regions=3, max_coverage=0.6, full_every=15):
+        self.static_rois = static_rois or {}
+        self.motion_threshold = motion_threshold  # Per-pixel difference, 0-255 scale
+        self.downsample = downsample
+        self.padding = padding
+        self.min_size = min_size
+        self.max_regions = max_regions
+        self.max_coverage = max_coverage
+        self.full_every = full_every
+
+        self._references = {}
+        self._runs = {}
+
+    def static_roi(self, view, frame_shape):
+        """Static ROI of a camera in pixels; the whole frame if it was never calibrated"""
+        height, width = frame_shape[:2]
+        x1, y1, x2, y2 = self.static_rois.get(view, (0.0, 0.0, 1.0, 1.0))
+        return [int(x1 * width), int(y1 * height), int(x2 * width), int(y2 * height)]
+
+    def motion_boxes(self, view, frame, roi):
+        """Padded boxes around pixels that changed inside the ROI since the last call"""
+        d = self.downsample
+        small = cv2.cvtColor(frame[::d, ::d], cv2.COLOR_BGR2GRAY)
+        reference = self._references.get(view)
+        self._references[view] = small
+        if reference is None or reference.shape != small.shape:
+            return None
+
+        changed = (cv2.absdiff(small, reference) > self.motion_threshold).astype(np.uint8)
+        changed = cv2.dilate(changed, np.ones((3, 3), np.uint8))
+        contours, _ = cv2.findContours(changed, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        boxes = []
+        for contour in contours:
+            x, y, w, h = cv2.boundingRect(contour)
+            # Back to full resolution, padded and grown to a useful minimum size
+            cx, cy = (x + w / 2) * d, (y + h / 2) * d
+            half_w = max(w * d / 2 + self.padding, self.min_size / 2)
+            half_h = max(h * d / 2 + self.padding, self.min_size / 2)
+            box = [
+                max(int(cx - half_w), roi[0]), max(int(cy - half_h), roi[1]),
+                min(int(cx + half_w), roi[2]), min(int(cy + half_h), roi[3])
+            ]
+            if box[2] > box[0] and box[3] > box[1]:
+                boxes.append(box)
+        return merge_boxes(boxes)
+
+    def select(self, view, frame):
+        """(regions, full): pixel boxes to crop, and whether they cover the whole ROI"""
+        roi = self.static_roi(view, frame.shape)
+        boxes = self.motion_boxes(view, frame, roi)
+        self._runs[view] = self._runs.get(view, 0) + 1
+
+        roi_area = (roi[2] - roi[0]) * (roi[3] - roi[1])
+        full = (
+            not boxes
+            or len(boxes) > self.max_regions
+            or sum((b[2] - b[0]) * (b[3] - b[1]) for b in boxes) > self.max_coverage * roi_area
+            or self._runs[view] % self.full_every == 0
+        )
+        regions = [roi] if full else boxes
+        return regions, full
+
+class RegionDetector:
+    """
+    Wraps a backend so it only sees ROI crops. All crops of all cameras go
+    through one predict_batch call and come back in full-frame coordinates.
+    Items outside this run's motion regions keep their previous boxes.
+
+    Crops only save work when the backend runs them at a smaller input
+    (`flexible_input`, e.g. an ONNX model exported with dynamic axes). A
+    fixed-shape model would enlarge every crop to its full input, so it
+    gets the static ROI of each camera once per run instead of motion crops.
+    `pixel_ratio` compares the model input pixels actually run with what
+    whole frames would have cost.
+    """
+
+    def __init__(self, backend, selector):
+        self.backend = backend
+        self.selector = selector
+        self.name = backend.name
+        self._previous = {}
+        self.input_pixels = 0
+        self.full_frame_pixels = 0
+
+    def predict(self, frame):
+        return self.predict_batch([frame])[0]
+
+    def predict_batch(self, frames):
+        crops, owners = [], []
+        plans = []
+        for view, frame in enumerate(frames):
+            regions, full = self.selector.select(view, frame)
+            if not self.backend.flexible_input:
+                regions, full = [self.selector.static_roi(view, frame.shape)], True
+            plans.append((regions, full))
+            for region in regions:
+                crops.append(frame[region[1]:region[3], region[0]:region[2]])
+                owners.append((view, region))
+
+        self.input_pixels += sum(math.prod(self.backend.input_shape_for(crop)) for crop in crops)
+        self.full_frame_pixels += sum(math.prod(self.backend.input_shape_for(frame)) for frame in frames)
+
+        outputs = self.backend.predict_batch(crops) if crops else []
+        per_view = [[] for _ in frames]
+        for (view, region), predictions in zip(owners, outputs):
+            if len(predictions):
+                per_view[view].append(offset_predictions(predictions, region))
+
+        results = []
+        for view, (regions, full) in enumerate(plans):
+            found = per_view[view]
+            previous = self._previous.get(view)
+            if not full and previous is not None and len(previous):
+                # Nothing moved there, so last run's boxes still hold
+                found.append(previous[~centers_inside(previous, regions)])
+            predictions = np.concatenate(found) if found else np.zeros((0, 6), dtype=np.float32)
+            self._previous[view] = predictions
+            results.append(predictions)
+        return results
+
+    @property
+    def pixel_ratio(self):
+        """Model input pixels run, as a share of running every whole frame"""
+        return self.input_pixels / self.full_frame_pixels if self.full_frame_pixels else 1.0
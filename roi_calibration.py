@@ -0,0 +1,133 @@
+import os
+import tkinter as tk
+from tkinter import messagebox
+
+from PIL import Image, ImageTk
+
+from camera_sources import open_sources
+from cart_config import CONFIG_PATH, load_cart_config, save_cart_section
+
+class ROICalibrator:
+    """
+    Draw the basket region once per cart camera. The regions are saved to
+    cart_config.yaml as fractions of the frame and used by roi.RegionSelector.
+    """
+
+    def __init__(self, camera_specs, config_path=CONFIG_PATH):
+        self.config_path = config_path
+        self.sources = open_sources(camera_specs)
+        self.rois = dict(load_cart_config(config_path).get('roi') or {})
+        self.current_view = 0
+        self.current_rect = None
+        self.start_x = self.start_y = 0
+        self.setup_gui()
+
+    def setup_gui(self):
+        self.root = tk.Tk()
+        self.root.title("Cart ROI Calibration")
+
+        self.canvas = tk.Canvas(self.root, width=640, height=480, bg='gray')
+        self.canvas.pack(side=tk.LEFT)
+
+        control_panel = tk.Frame(self.root, width=200)
+        control_panel.pack(side=tk.RIGHT, fill=tk.Y, padx=5, pady=5)
+
+        self.camera_label = tk.Label(control_panel, text="", font=("Arial", 12, "bold"))
+        self.camera_label.pack(pady=5)
+        tk.Button(control_panel, text="Refresh Frame (F)", command=self.load_frame).pack(pady=2)
+        tk.Button(control_panel, text="Next Camera (N)", command=self.next_camera).pack(pady=2)
+        tk.Button(control_panel, text="Whole Frame (R)", command=self.reset_roi).pack(pady=2)
+        tk.Button(control_panel, text="Save (S)", command=self.save).pack(pady=2)
+
+        instructions = """
+        Instructions:
+        1. Drag a box around the
+           basket area
+        2. 'N' for the next camera
+        3. 'S' saves all cameras
+        """
+        tk.Label(control_panel, text=instructions, justify=tk.LEFT, wraplength=180).pack(pady=10)
+
+        self.canvas.bind("<ButtonPress-1>", self.start_drawing)
+        self.canvas.bind("<B1-Motion>", self.draw_rectangle)
+        self.canvas.bind("<ButtonRelease-1>", self.stop_drawing)
+        self.root.bind('f', lambda e: self.load_frame())
+        self.root.bind('n', lambda e: self.next_camera())
+        self.root.bind('r', lambda e: self.reset_roi())
+        self.root.bind('s', lambda e: self.save())
+
+        self.load_frame()
+
+    def load_frame(self):
+        source = self.sources[self.current_view]
+        try:
+            frame = source.read()
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not read from {source.name}: {e}")
+            return
+
+        self.frame_height, self.frame_width = frame.shape[:2]
+        self.canvas.config(width=self.frame_width, height=self.frame_height)
+        self.photo = ImageTk.PhotoImage(image=Image.fromarray(frame))
+        self.canvas.delete("all")
+        self.canvas.create_image(0, 0, image=self.photo, anchor="nw")
+        self.camera_label.config(text=f"Camera {self.current_view + 1}/{len(self.sources)}: {source.name}")
+        self.draw_roi()
+
+    def draw_roi(self):
+        if self.current_rect:
+            self.canvas.delete(self.current_rect)
+        x1, y1, x2, y2 = self.rois.get(self.current_view, (0.0, 0.0, 1.0, 1.0))
+        self.current_rect = self.canvas.create_rectangle(
+            x1 * self.frame_width, y1 * self.frame_height,
+            x2 * self.frame_width, y2 * self.frame_height,
+            outline="red", width=2
+        )
+
+    def start_drawing(self, event):
+        self.start_x, self.start_y = event.x, event.y
+
+    def draw_rectangle(self, event):
+        if self.current_rect:
+            self.canvas.delete(self.current_rect)
+        self.current_rect = self.canvas.create_rectangle(
+            self.start_x, self.start_y, event.x, event.y, outline="red", width=2
+        )
+
+    def stop_drawing(self, event):
+        x1, x2 = sorted((self.start_x, event.x))
+        y1, y2 = sorted((self.start_y, event.y))
+        if x2 - x1 < 10 or y2 - y1 < 10:
+            return
+        clamp = lambda value: round(max(0.0, min(1.0, value)), 4)
+        self.rois[self.current_view] = [
+            clamp(x1 / self.frame_width), clamp(y1 / self.frame_height),
+            clamp(x2 / self.frame_width), clamp(y2 / self.frame_height)
+        ]
+        self.draw_roi()
+
+    def reset_roi(self):
+        self.rois[self.current_view] = [0.0, 0.0, 1.0, 1.0]
+        self.draw_roi()
+
+    def next_camera(self):
+        self.current_view = (self.current_view + 1) % len(self.sources)
+        self.current_rect = None
+        self.load_frame()
+
+    def save(self):
+        try:
+            save_cart_section('roi', self.rois, self.config_path)
+            messagebox.showinfo("Saved", f"ROIs for {len(self.rois)} camera(s) saved to {self.config_path}")
+        except Exception as e:
+            print(f"Error saving ROIs: {e}")
+            messagebox.showerror("Error", "Failed to save ROIs!")
+
+    def run(self):
+        self.root.mainloop()
+        for source in self.sources:
+            source.close()
+
+if __name__ == "__main__":
+    calibrator = ROICalibrator(os.environ.get("CHECKOUT_CAMERAS", "picam:0"))
+    calibrator.run()
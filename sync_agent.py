@@ -0,0 +1,202 @@
+"""
+Uploads finished orders from a cart's order store to a central service.
+
+    python sync_agent.py serve --port 8765                 # local stand-in server
+    python sync_agent.py push --endpoint http://localhost:8765/orders --once
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import random
+import socket
+import sqlite3
+import threading
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from order_store import OrderStore
+
+def batch_key(cart_id, order_ids):
+    """Same orders from the same cart always give the same key, so a retried batch is recognisable"""
+    return hashlib.sha256(f"{cart_id}:{','.join(map(str, order_ids))}".encode()).hexdigest()
+
+class SyncAgent:
+    """
+    Background uploader for the order store.
+
+    Every `interval` seconds it takes up to `batch_size` unsynced orders,
+    posts them as one gzipped JSON body and marks them synced once the
+    server answers 2xx. Each order carries an idempotency key
+    (cart id + local order id) and the batch one in the Idempotency-Key
+    header, so a retry after a lost response cannot double-count. While
+    the endpoint is unreachable orders simply stay queued in SQLite and the
+    retry delay backs off exponentially (with jitter) up to `max_backoff`.
+    """
+
+    def __init__(self, store, endpoint, cart_id=None, batch_size=100, interval=30.0,
+                 max_backoff=300.0, timeout=10.0, api_key=None):
+        self.store = store
+        self.endpoint = endpoint
+        self.cart_id = cart_id or socket.gethostname()
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.api_key = api_key
+
+        self.failures = 0
+        self.uploaded = 0
+        self.last_error = None
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def build_request(self, orders):
+        order_ids = [order['order_id'] for order in orders]
+        key = batch_key(self.cart_id, order_ids)
+        payload = {
+            'cart_id': self.cart_id,
+            'batch_key': key,
+            'orders': [dict(order, idempotency_key=f"{self.cart_id}:{order['order_id']}") for order in orders]
+        }
+        body = gzip.compress(json.dumps(payload, separators=(',', ':')).encode())
+        headers = {
+            'Content-Type': 'application/json',
+            'Content-Encoding': 'gzip',
+            'Idempotency-Key': key
+        }
+        if self.api_key:
+            headers['Authorization'] = f"Bearer {self.api_key}"
+        return urllib.request.Request(self.endpoint, data=body, headers=headers, method='POST')
+
+    def sync_once(self):
+        """Upload one batch; returns the number of orders synced (0 when there was nothing to do)"""
+        orders = self.store.pending_orders(self.batch_size)
+        if not orders:
+            return 0
+        with urllib.request.urlopen(self.build_request(orders), timeout=self.timeout) as response:
+            if not 200 <= response.status < 300:
+                raise IOError(f"Sync endpoint returned HTTP {response.status}")
+        self.store.mark_synced([order['order_id'] for order in orders])
+        self.uploaded += len(orders)
+        return len(orders)
+
+    def next_delay(self):
+        if not self.failures:
+            return self.interval
+        backoff = min(self.max_backoff, self.interval * 2 ** (self.failures - 1))
+        return backoff * random.uniform(0.5, 1.0)
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                # Drain the backlog in full batches, then wait for new orders
+                while self.sync_once() == self.batch_size and not self._stop_event.is_set():
+                    pass
+                self.failures = 0
+                self.last_error = None
+            except (urllib.error.URLError, OSError, ValueError, sqlite3.Error) as e:
+                # A locked database must not end the thread; its orders stay unsynced and are retried
+                self.failures += 1
+                self.last_error = str(e)
+                print(f"Order sync failed ({self.failures} in a row): {e}")
+            self._stop_event.wait(self.next_delay())
+
+    def start(self):
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self.run, name="order-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Minimal central service: accepts batches, de-duplicates orders by idempotency key"""
+
+    def do_POST(self):
+        server = self.server
+        if server.fail_rate and random.random() < server.fail_rate:
+            self.send_response(503)
+            self.end_headers()
+            return
+
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            self.send_response(400)
+            self.end_headers()
+            return
+
+        with server.lock:
+            new = [o for o in payload['orders'] if o['idempotency_key'] not in server.orders]
+            for order in new:
+                server.orders[order['idempotency_key']] = order
+            server.batches += 1
+
+        response = json.dumps({'accepted': len(new), 'duplicates': len(payload['orders']) - len(new)}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+        print(f"{payload['cart_id']}: batch of {len(payload['orders'])} ({len(new)} new, "
+              f"{len(body) // 1024} KB json), {len(server.orders)} orders total")
+
+    def log_message(self, format, *args):
+        pass
+
+def make_stand_in_server(port=8765, fail_rate=0.0):
+    server = ThreadingHTTPServer(('127.0.0.1', port), StandInHandler)
+    server.orders = {}
+    server.batches = 0
+    server.lock = threading.Lock()
+    server.fail_rate = fail_rate
+    return server
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Upload cart orders, or run a stand-in sync server")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    serve = subparsers.add_parser('serve', help="run the local stand-in server")
+    serve.add_argument('--port', type=int, default=8765)
+    serve.add_argument('--fail-rate', type=float, default=0.0, help="share of requests answered with 503")
+
+    push = subparsers.add_parser('push', help="upload unsynced orders")
+    push.add_argument('--endpoint', default='http://127.0.0.1:8765/orders')
+    push.add_argument('--db', default='orders.sqlite')
+    push.add_argument('--cart-id')
+    push.add_argument('--batch-size', type=int, default=100)
+    push.add_argument('--once', action='store_true', help="upload the backlog and exit")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if args.command == 'serve':
+        server = make_stand_in_server(args.port, args.fail_rate)
+        print(f"Stand-in sync server on http://127.0.0.1:{args.port}/orders")
+        server.serve_forever()
+        return
+
+    store = OrderStore(args.db)
+    agent = SyncAgent(store, args.endpoint, args.cart_id, args.batch_size)
+    try:
+        if args.once:
+            while agent.sync_once():
+                pass
+            print(f"Uploaded {agent.uploaded} orders, {store.stats()['unsynced']} left")
+        else:
+            agent.run()
+    except Exception as e:
+        print(f"Error during sync: {e}")
+    finally:
+        store.close()
+
+if __name__ == "__main__":
+    main()
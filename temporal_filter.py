@@ -0,0 +1,83 @@
+from collections import deque
+
+
+class TrackState:
+    def __init__(self, confidence, window):
+        self.ema = confidence
+        self.seen = deque([True], maxlen=window)
+
+    @property
+    def misses(self):
+        """Consecutive runs the track has not been seen"""
+        count = 0
+        for seen in reversed(self.seen):
+            if seen:
+                break
+            count += 1
+        return count
+
+
+class TemporalFilter:
+    """
+    Lets a tracked object through only once it is consistently detected.
+
+    Per track ID it keeps an exponential moving average of confidence and
+    the last `n` detection runs. A track is reported when it was seen in at
+    least `k` of them and its averaged confidence clears its class threshold,
+    so single-frame flickers never reach the overlay or the cart. Reported
+    detections carry the averaged confidence, the raw one is kept as
+    'raw_confidence'.
+    """
+
+    def __init__(self, alpha=0.3, k=3, n=5, default_threshold=0.5, class_thresholds=None):
+        self.alpha = alpha
+        self.k = k
+        self.n = n
+        self.default_threshold = default_threshold
+        self.class_thresholds = class_thresholds or {}
+        self.states = {}
+
+    @classmethod
+    def from_config(cls, config):
+        """Build from the 'smoothing' section of cart_config.yaml"""
+        config = config or {}
+        return cls(
+            alpha=config.get('alpha', 0.3),
+            k=config.get('k', 3),
+            n=config.get('n', 5),
+            default_threshold=config.get('default_threshold', 0.5),
+            class_thresholds=config.get('class_thresholds')
+        )
+
+    def threshold(self, class_name):
+        return self.class_thresholds.get(class_name, self.default_threshold)
+
+    def update(self, detections):
+        """Feed one run of tracked detections, return those that pass the vote and threshold"""
+        visible = {det['track_id']: det for det in detections if det.get('track_id') is not None}
+
+        for track_id, state in self.states.items():
+            if track_id not in visible:
+                state.seen.append(False)
+                state.ema *= 1 - self.alpha
+
+        passed = []
+        for track_id, det in visible.items():
+            state = self.states.get(track_id)
+            if state is None:
+                state = self.states[track_id] = TrackState(det['confidence'], self.n)
+            else:
+                state.seen.append(True)
+                state.ema = self.alpha * det['confidence'] + (1 - self.alpha) * state.ema
+
+            if sum(state.seen) >= self.k and state.ema >= self.threshold(det['class']):
+                passed.append(dict(det, confidence=state.ema, raw_confidence=det['confidence']))
+
+        # Forget tracks that have been gone for a whole window
+        self.states = {
+            track_id: state for track_id, state in self.states.items() if state.misses < self.n
+        }
+        return passed
+
+    def reset(self):
+        self.states = {}